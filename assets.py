@@ -0,0 +1,87 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio import load_wav
+
+# everything is resolved next to this file, not the working directory
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOUNDS_DIR = os.path.join(ROOT, "Sounds")
+IMAGES_DIR = os.path.join(ROOT, "Assets")
+CACHE_DIR = os.path.join(ROOT, ".cache", "assets")
+
+CACHE_VERSION = 1
+
+
+class DecodedCache:
+    """
+    Decoded assets (note sprite pixels) kept as .npy files.
+
+    The key is the source path, size and mtime plus a tag for decode
+    settings such as the scale, so a changed file or setting is
+    decoded again without reading the source just to hash it. Hits are
+    memory-mapped read-only. Safe to use from several threads: every
+    entry is written to a temporary name and moved into place.
+    """
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, path, tag):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{tag}|v{CACHE_VERSION}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+    def load(self, path, decode, tag=""):
+        """
+        decode(path) -> ndarray, called only on a cache miss.
+        """
+        cached = self._path(path, tag)
+        if os.path.exists(cached):
+            try:
+                data = np.load(cached, mmap_mode="r")
+                self.hits += 1
+                return data
+            except (ValueError, OSError):
+                pass  # damaged cache file => decode again
+
+        data = decode(path)
+        self.misses += 1
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.{id(data)}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp, cached)
+        except OSError as e:
+            print(f"Warning: could not cache {path}: {e}")
+        return data
+
+
+class AssetLoader:
+    """
+    Decodes assets on a small thread pool. WAV decoding and .npy loads are
+    mostly numpy and file I/O, which run without the GIL, so the files load
+    side by side while the GUI thread builds the window.
+
+    Every submit_* returns a concurrent.futures.Future.
+    """
+    def __init__(self, cache=None, workers=4):
+        self.cache = cache or DecodedCache()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets")
+
+    def submit(self, path, decode, tag=""):
+        return self.pool.submit(self.cache.load, path, decode, tag)
+
+    def submit_sample(self, path, sample_rate):
+        """
+        Decodes a WAV without caching it: samples only get decoded to
+        build the sample bank, which then serves them from its own file.
+        """
+        return self.pool.submit(load_wav, path, sample_rate)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,252 @@
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+
+def resample(data, src_rate, dst_rate):
+    """
+    Linear-interpolation resample of a mono float32 buffer.
+    """
+    if src_rate == dst_rate or len(data) == 0:
+        return data
+    n_out = max(1, int(round(len(data) * dst_rate / float(src_rate))))
+    x = np.arange(n_out, dtype=np.float64) * (src_rate / float(dst_rate))
+    return np.interp(x, np.arange(len(data)), data).astype(np.float32)
+
+
+def load_wav(path, sample_rate):
+    """
+    Decodes a PCM WAV file to mono float32 in -1..1 at sample_rate.
+    """
+    with wave.open(path, "rb") as w:
+        channels = w.getnchannels()
+        width = w.getsampwidth()
+        rate = w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width {width} in {path}")
+    if channels > 1:
+        data = data.reshape(-1, channels).mean(axis=1)
+    return resample(data, rate, sample_rate)
+
+
+class AudioEngine:
+    """
+    Polyphonic sample player with a fixed voice pool.
+
+    note_on/note_off only append to a command deque, so any thread can call
+    them without waiting; render() applies pending commands at the start of
+    each block and mixes every active voice. When all voices are busy the
+    oldest one is stolen (releasing voices go first). note_off fades the
+    voice out over release_ms instead of cutting it.
+    """
+    def __init__(self, sample_rate=44100, block_size=512, max_voices=24,
+                 release_ms=120, master_gain=0.6):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.max_voices = max_voices
+        self.release_samples = max(1, int(sample_rate * release_ms / 1000))
+        self.master_gain = master_gain
+        self.samples = {}
+
+        self.voice_note = [None] * max_voices
+        self.voice_pos = np.zeros(max_voices, dtype=np.int64)
+        self.voice_gain = np.zeros(max_voices, dtype=np.float32)
+        self.voice_env = np.zeros(max_voices, dtype=np.float32)
+        self.voice_releasing = np.zeros(max_voices, dtype=bool)
+        self.voice_active = np.zeros(max_voices, dtype=bool)
+        self.voice_started = np.zeros(max_voices, dtype=np.int64)
+
+        self.commands = deque()
+        self.clock = 0  # samples rendered so far
+        self.stolen = 0
+        self.peak_voices = 0
+        self.latency_ms = 0.0
+
+    def has(self, note):
+        return note in self.samples
+
+    def add_sample(self, note, data):
+        self.samples[note] = np.ascontiguousarray(data, dtype=np.float32)
+
+    def load(self, note, path):
+        self.add_sample(note, load_wav(path, self.sample_rate))
+
+    def note_on(self, note, velocity=1.0):
+        self.commands.append(("on", note, velocity, time.perf_counter()))
+
+    def note_off(self, note):
+        self.commands.append(("off", note, 0.0, time.perf_counter()))
+
+    def active_voices(self):
+        return int(np.count_nonzero(self.voice_active))
+
+    def _free_voice(self):
+        free = np.flatnonzero(~self.voice_active)
+        if len(free):
+            return int(free[0])
+        self.stolen += 1
+        releasing = np.flatnonzero(self.voice_releasing)
+        if len(releasing):
+            return int(releasing[np.argmin(self.voice_started[releasing])])
+        return int(np.argmin(self.voice_started))
+
+    def _apply(self, cmd):
+        kind, note, velocity, _ = cmd
+        if kind == "on":
+            if note not in self.samples:
+                return
+            v = self._free_voice()
+            self.voice_note[v] = note
+            self.voice_pos[v] = 0
+            self.voice_gain[v] = velocity
+            self.voice_env[v] = 1.0
+            self.voice_releasing[v] = False
+            self.voice_active[v] = True
+            self.voice_started[v] = self.clock
+            self.peak_voices = max(self.peak_voices, self.active_voices())
+        else:
+            for v in range(self.max_voices):
+                if self.voice_active[v] and self.voice_note[v] == note:
+                    self.voice_releasing[v] = True
+
+    def render(self, frames=None):
+        """
+        Mixes the next block. Returns mono float32 of length frames.
+        """
+        frames = frames or self.block_size
+        now = time.perf_counter()
+        while self.commands:
+            cmd = self.commands.popleft()
+            if cmd[0] == "on":
+                # time from note_on() to the block that starts it
+                self.latency_ms = 0.9*self.latency_ms + 0.1*(now - cmd[3])*1000
+            self._apply(cmd)
+        return self._mix(frames)
+
+    def _mix(self, frames):
+        out = np.zeros(frames, dtype=np.float32)
+        step = 1.0 / self.release_samples
+        for v in np.flatnonzero(self.voice_active):
+            data = self.samples[self.voice_note[v]]
+            pos = int(self.voice_pos[v])
+            n = min(frames, len(data) - pos)
+            chunk = data[pos:pos+n] * self.voice_gain[v]
+            if self.voice_releasing[v]:
+                env = self.voice_env[v] - step * np.arange(1, n + 1, dtype=np.float32)
+                np.maximum(env, 0.0, out=env)
+                chunk *= env
+                self.voice_env[v] = env[-1] if n else 0.0
+                if self.voice_env[v] <= 0.0:
+                    n = 0  # faded out
+            out[:len(chunk)] += chunk
+            self.voice_pos[v] = pos + len(chunk)
+            if n <= 0 or self.voice_pos[v] >= len(data):
+                self.voice_active[v] = False
+                self.voice_note[v] = None
+        self.clock += frames
+        out *= self.master_gain
+        np.clip(out, -1.0, 1.0, out=out)
+        return out
+
+    def render_offline(self, events, duration):
+        """
+        Renders without a sound card.
+
+        events: iterable of (time_s, "on"/"off", note, velocity), any order.
+        An event is picked up at the first block boundary at or after its
+        time, exactly like the live thread, so the report reflects real
+        block quantisation. output_latency_ms adds the mixer buffer plus the
+        one queued block the live thread keeps ahead.
+
+        Returns (mono float32 audio, report dict).
+        """
+        events = sorted(events, key=lambda e: e[0])
+        sr = float(self.sample_rate)
+        total = int(duration * sr)
+        out = np.zeros(total, dtype=np.float32)
+        latencies = []
+        i = 0
+        pos = 0
+        while pos < total:
+            while i < len(events) and events[i][0] * sr <= pos:
+                t, kind, note, velocity = events[i]
+                i += 1
+                if kind == "on":
+                    latencies.append((pos - t * sr) * 1000.0 / sr)
+                self._apply((kind, note, velocity, 0.0))
+            n = min(self.block_size, total - pos)
+            out[pos:pos+n] = self._mix(self.block_size)[:n]
+            pos += n
+        block_ms = self.block_size * 1000.0 / sr
+        return out, {
+            "latency_ms": latencies,
+            "max_latency_ms": max(latencies) if latencies else 0.0,
+            "output_latency_ms": 2 * block_ms,
+            "peak_voices": self.peak_voices,
+            "stolen": self.stolen,
+            "block_ms": block_ms,
+        }
+
+
+class AudioOutput(threading.Thread):
+    """
+    Dedicated mixing thread feeding an AudioEngine into a reserved pygame
+    mixer channel, one block ahead. pygame.mixer must already be initialised
+    at the engine's sample rate with a buffer of block_size, unless
+    init_mixer is set: then the thread imports pygame and opens (and at the
+    end closes) the mixer itself, so none of that delays the caller.
+    """
+    def __init__(self, engine, init_mixer=False):
+        super().__init__(name="audio", daemon=True)
+        self.engine = engine
+        self.init_mixer = init_mixer
+        self.ready_at = None  # perf_counter time the first block was queued
+        self.underruns = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(1.0)
+
+    def run(self):
+        import pygame
+
+        if self.init_mixer:
+            pygame.mixer.pre_init(self.engine.sample_rate, -16, 2, self.engine.block_size)
+            pygame.mixer.init()
+        pygame.mixer.set_reserved(1)
+        channel = pygame.mixer.Channel(0)
+        mixer_channels = pygame.mixer.get_init()[2]
+        block_s = self.engine.block_size / float(self.engine.sample_rate)
+        started = False
+        while not self._stop_event.is_set():
+            if channel.get_queue() is None:
+                block = self.engine.render()
+                pcm = (block * 32767.0).astype(np.int16)
+                if mixer_channels > 1:
+                    pcm = np.repeat(pcm[:, None], mixer_channels, axis=1)
+                sound = pygame.sndarray.make_sound(pcm)
+                if not channel.get_busy():
+                    if started:
+                        self.underruns += 1
+                    channel.play(sound)
+                    if not started:
+                        self.ready_at = time.perf_counter()
+                    started = True
+                else:
+                    channel.queue(sound)
+            time.sleep(block_s / 4)
+        channel.stop()
+        if self.init_mixer:
+            pygame.mixer.quit()
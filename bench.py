@@ -0,0 +1,430 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import tempfile
+
+# headless by default; an explicit setting still wins
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import cv2
+import numpy as np
+
+from pipeline import AllocMeter, FrameRing, HandResult, NUM_LANDMARKS
+from tracking import RoiTracker, INFERENCE_MODES
+from judgement import JudgementEngine
+from scheduler import simulate_schedule
+from audio import AudioEngine
+from replay import LandmarkRecorder, LandmarkRecording
+
+STAGES = ("capture", "inference", "hit_test", "scoring", "schedule", "audio",
+          "tiles", "effects", "render", "loop")
+
+
+def measure(fn, iterations, warmup=10, alloc_iterations=50):
+    """
+    Times fn() per call, then runs it again under tracemalloc for the
+    allocation figure so tracing does not slow the timed pass.
+    """
+    for _ in range(warmup):
+        fn()
+    times = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - t0
+
+    meter = AllocMeter()
+    allocs = np.empty(alloc_iterations)
+    for i in range(alloc_iterations):
+        fn()
+        allocs[i] = meter.tick()
+    meter.stop()
+
+    ms = times * 1000.0
+    return {
+        "iterations": iterations,
+        "fps": iterations / times.sum() if times.sum() > 0 else 0.0,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "alloc_bytes": float(np.median(allocs)),
+    }
+
+
+def cycle(items):
+    """
+    Endless round-robin over a list; returns a next() function.
+    """
+    state = {"i": 0}
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+
+# -- inputs --
+
+def synthetic_frames(width, height, count=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def video_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"no frames could be read from {path}")
+    return frames
+
+
+def synthetic_landmarks(count, seed=0):
+    """
+    Two hands wandering over the keyboard with fingers randomly up or down,
+    stamped 33 ms apart.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for i in range(count):
+        centres = np.stack([0.3 + 0.4 * rng.random(2), 0.55 + 0.1 * rng.random(2)], axis=1)
+        lm = np.empty((2, NUM_LANDMARKS, 3), dtype=np.float32)
+        lm[..., :2] = centres[:, None, :] + rng.normal(0.0, 0.03, (2, NUM_LANDMARKS, 2))
+        lm[..., 2] = rng.normal(0.0, 0.01, (2, NUM_LANDMARKS))
+        results.append(HandResult(i + 1, i * 0.033, 640, 480, lm))
+    return results
+
+
+def write_landmarks(results, path):
+    rec = LandmarkRecorder(path)
+    for r in results:
+        rec.write(r)
+    rec.close()
+
+
+# -- stages without a window --
+
+def bench_capture(frames, iterations):
+    h, w = frames[0].shape[:2]
+    ring = FrameRing(w, h)
+    next_frame = cycle(frames)
+    state = {"id": 0}
+    def step():
+        slot = ring.acquire()
+        cv2.flip(next_frame(), 1, dst=ring.frames[slot])
+        state["id"] += 1
+        ring.commit(slot, state["id"], 0.0)
+    return measure(step, iterations)
+
+
+def bench_inference(frames, iterations, mode, size):
+    """
+    The crop/convert work around hands.process, plus hands.process itself
+    when MediaPipe is installed.
+    """
+    tracker = RoiTracker(mode, max_side=size)
+    hands = None
+    try:
+        import mediapipe as mp
+        from pipeline import HANDS_OPTIONS
+        hands = mp.solutions.hands.Hands(**HANDS_OPTIONS)
+    except (ImportError, AttributeError):
+        pass
+    next_frame = cycle(frames)
+    def step():
+        rgb, _ = tracker.prepare(next_frame())
+        if hands is not None:
+            hands.process(rgb)
+    res = measure(step, iterations)
+    res["mediapipe"] = hands is not None
+    res["mode"] = mode
+    if hands is not None:
+        hands.close()
+    return res
+
+
+def bench_scoring(iterations):
+    """
+    Dense four-note chords every 50 ms, every note pressed 20 ms late.
+    """
+    judge = JudgementEngine()
+    notes = ["c4", "e4", "g4", "c5"]
+    state = {"t": 0.0}
+    def step():
+        t = state["t"]
+        for nm in notes:
+            judge.add_target(nm, t + 1.0)
+        for nm in notes:
+            judge.press(nm, at=t + 0.02)
+        judge.expire(now=t)
+        state["t"] = t + 0.05
+    res = measure(step, iterations)
+    res["judged"] = judge.stats()
+    return res
+
+
+def bench_schedule(iterations):
+    """
+    A 32-note song with chords and a tempo change, scheduled on a virtual
+    30 ms +-10 ms tick. error_ms is the worst per-note timing error.
+    """
+    melody = [("c4+e4+g4" if i % 8 == 0 else ("c4", "d4", "e4", "g4")[i % 4], 0 if i == 0 else 120)
+              for i in range(32)]
+    state = {}
+    def step():
+        state["report"] = simulate_schedule(melody, tempo=1.0, fall_time=0.5,
+                                            tempo_changes=[(1.5, 1.5)])
+    res = measure(step, max(1, iterations // 10), warmup=2, alloc_iterations=5)
+    report = state["report"]
+    res["error_ms"] = report["max_abs_ms"]
+    res["mean_error_ms"] = report["mean_abs_ms"]
+    res["events"] = report["events"]
+    return res
+
+
+def bench_audio(iterations, block_size=512):
+    """
+    2 s of four-note chords every 50 ms rendered offline, with note offs and
+    voice stealing. error_ms is the worst note-on delay from block
+    quantisation (at most one block).
+    """
+    rate = 44100
+    tone = (0.3 * np.sin(np.arange(rate // 2) * 2 * np.pi * 440 / rate)).astype(np.float32)
+    notes = ["c4", "e4", "g4", "c5"]
+    events = []
+    for k in range(40):
+        t = k * 0.05 + 0.003 * (k % 7)  # off the block grid on purpose
+        for nm in notes:
+            events.append((t, "on", nm, 0.8))
+            events.append((t + 0.04, "off", nm, 0.0))
+    state = {}
+    def step():
+        engine = AudioEngine(sample_rate=rate, block_size=block_size)
+        for nm in notes:
+            engine.add_sample(nm, tone)
+        _, state["report"] = engine.render_offline(events, 2.5)
+    res = measure(step, max(1, iterations // 10), warmup=2, alloc_iterations=5)
+    report = state["report"]
+    res["error_ms"] = report["max_latency_ms"]
+    res["block_ms"] = report["block_ms"]
+    res["peak_voices"] = report["peak_voices"]
+    res["stolen"] = report["stolen"]
+    return res
+
+
+# -- stages that need the app --
+
+def make_piano(landmark_path, leaderboard_path):
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    import piano
+    window = piano.ARPiano(replay_landmarks=landmark_path, replay_speed=0,
+                           leaderboard_path=leaderboard_path)
+    window.timer.stop()  # the benchmark drives every tick itself
+    window.show()
+    app.processEvents()
+    return app, window
+
+
+def bench_hit_test(window, landmarks, iterations):
+    next_result = cycle(landmarks)
+    return measure(lambda: window.process_hands(next_result()), iterations)
+
+
+def bench_tiles(window, iterations, live=48):
+    layer = window.tile_layer
+    names = layer.note_names
+    next_name = cycle(names)
+    def step():
+        while layer.engine.count < live:
+            layer.spawnTile(next_name(), fall_speed=600)
+        layer.update_tiles()
+    return measure(step, iterations)
+
+
+def bench_effects(window, iterations, per_tick=4):
+    names = [nm for (_, nm) in window.keys_info]
+    next_name = cycle(names)
+    def step():
+        for _ in range(per_tick):
+            window.spawnFlyingNoteOnKey(next_name())
+        window.effects_layer.update_particles()
+    return measure(step, iterations)
+
+
+def bench_render(app, window, frames, iterations):
+    """
+    A full repaint of the compositor with a camera frame, tiles and notes up.
+    """
+    next_frame = cycle(frames)
+    for nm in [nm for (_, nm) in window.keys_info][:12]:
+        window.tile_layer.spawnTile(nm)
+        window.spawnFlyingNoteOnKey(nm)
+    def step():
+        window.show_frame(next_frame())
+        window.tile_layer.update_tiles()
+        window.effects_layer.update_particles()
+        window.compositor.repaint()
+    return measure(step, iterations)
+
+
+def bench_loop(app, window, frames, iterations):
+    """
+    update_camera() plus the paint it triggers, with a song playing in
+    Teach OFF mode and landmarks replayed one per tick.
+    """
+    if not window.auto_play_muted:
+        window.toggleTeach()
+    if window.musicBox.count():
+        window.onPlayMusicClicked()
+    next_frame = cycle(frames)
+    def step():
+        if window.pipeline.finished():
+            window.pipeline.start()  # loop the recording
+        window.update_camera()
+        window.show_frame(next_frame())
+        app.processEvents()
+    return measure(step, iterations)
+
+
+# -- baseline --
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regression messages: p95 latency up or fps down by
+    more than `tolerance` (a fraction) against the baseline, or for stages
+    that measure timing accuracy, error_ms up by more than that plus 1 ms.
+    """
+    problems = []
+    for name, base in baseline.get("stages", {}).items():
+        cur = results["stages"].get(name)
+        if cur is None:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {cur['p95_ms']:.3f} ms vs baseline {base['p95_ms']:.3f} ms")
+        if cur["fps"] < base["fps"] / (1 + tolerance):
+            problems.append(f"{name}: {cur['fps']:.0f} fps vs baseline {base['fps']:.0f} fps")
+        if "error_ms" in base and cur["error_ms"] > base["error_ms"] * (1 + tolerance) + 1.0:
+            problems.append(f"{name}: timing error {cur['error_ms']:.2f} ms "
+                            f"vs baseline {base['error_ms']:.2f} ms")
+    return problems
+
+
+def print_table(results):
+    print(f"{'stage':<10} {'fps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'alloc KB':>9} "
+          f"{'error ms':>9}")
+    for name, r in results["stages"].items():
+        error = f"{r['error_ms']:>9.2f}" if "error_ms" in r else f"{'-':>9}"
+        print(f"{name:<10} {r['fps']:>9.0f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} "
+              f"{r['p99_ms']:>8.3f} {r['alloc_bytes']/1024:>9.1f} {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AR Piano benchmarks (runs headless)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--video", help="use frames from this video file instead of synthetic ones")
+    parser.add_argument("--landmarks", help="use this landmark recording instead of synthetic hands")
+    parser.add_argument("--frame-size", default="1280x720", help="synthetic frame size WxH")
+    parser.add_argument("--inference-mode", choices=INFERENCE_MODES, default="downscale")
+    parser.add_argument("--inference-size", type=int, default=640)
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="compare against this results file, exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed slowdown against the baseline (fraction)")
+    args = parser.parse_args()
+
+    if args.video:
+        frames = video_frames(args.video, 120)
+        frame_source = args.video
+    else:
+        w, h = (int(v) for v in args.frame_size.lower().split("x"))
+        frames = synthetic_frames(w, h)
+        frame_source = f"synthetic {w}x{h}"
+
+    tmp = None
+    if args.landmarks:
+        landmark_path = args.landmarks
+    else:
+        fd, tmp = tempfile.mkstemp(suffix=".lmk")
+        os.close(fd)
+        write_landmarks(synthetic_landmarks(300), tmp)
+        landmark_path = tmp
+    recording = LandmarkRecording(landmark_path)
+    landmarks = [recording.result(i) for i in range(len(recording))]
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "frames": frame_source,
+            "landmarks": args.landmarks or "synthetic",
+            "iterations": args.iterations,
+        },
+        "stages": {},
+    }
+    stages = results["stages"]
+    n = args.iterations
+
+    if "capture" in args.stages:
+        stages["capture"] = bench_capture(frames, n)
+    if "inference" in args.stages:
+        stages["inference"] = bench_inference(frames, n, args.inference_mode, args.inference_size)
+    if "scoring" in args.stages:
+        stages["scoring"] = bench_scoring(n)
+    if "schedule" in args.stages:
+        stages["schedule"] = bench_schedule(n)
+    if "audio" in args.stages:
+        stages["audio"] = bench_audio(n)
+
+    app_stages = [s for s in ("hit_test", "tiles", "effects", "render", "loop") if s in args.stages]
+    if app_stages:
+        # a scratch leaderboard: benchmark runs stay out of the real leaderboard.db
+        scratch = tempfile.mkdtemp(prefix="arpiano-bench-")
+        app, window = make_piano(landmark_path, os.path.join(scratch, "leaderboard.db"))
+        if "hit_test" in app_stages:
+            stages["hit_test"] = bench_hit_test(window, landmarks, n)
+        if "tiles" in app_stages:
+            stages["tiles"] = bench_tiles(window, n)
+        if "effects" in app_stages:
+            stages["effects"] = bench_effects(window, n)
+        if "render" in app_stages:
+            stages["render"] = bench_render(app, window, frames, n)
+        if "loop" in app_stages:
+            stages["loop"] = bench_loop(app, window, frames, n)
+        window.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if tmp is not None:
+        os.remove(tmp)
+
+    print_table(results)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance*100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
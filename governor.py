@@ -0,0 +1,112 @@
+import time
+from collections import namedtuple
+
+# inference_side: long side of the image given to MediaPipe (None => as captured)
+# frame_skip: camera frames skipped between two inferences
+Quality = namedtuple("Quality", ["inference_side", "model_complexity", "frame_skip",
+                                 "smooth_preview", "particles"])
+
+# best first
+QUALITY_LEVELS = (
+    Quality(None, 1, 0, True, 128),
+    Quality(640, 1, 0, True, 96),
+    Quality(480, 1, 1, False, 64),
+    Quality(384, 0, 1, False, 48),
+    Quality(256, 0, 2, False, 24),
+)
+
+# what the GUI timer can be asked for; it ticks every whole millisecond
+MIN_TARGET_FPS = 5
+MAX_TARGET_FPS = 120
+
+
+def clamp_target_fps(target_fps):
+    return min(MAX_TARGET_FPS, max(MIN_TARGET_FPS, target_fps))
+
+
+def tick_interval_ms(target_fps):
+    """
+    GUI timer interval for target_fps, rounded down so the timer alone
+    never keeps the tick under target.
+    """
+    return max(1, int(1000.0 / clamp_target_fps(target_fps)))
+
+
+class QualityGovernor:
+    """
+    Keeps the GUI tick near target_fps by stepping through QUALITY_LEVELS.
+
+    tick() is called once per update_camera with the monotonic time and the
+    latest inference ms. A smoothed tick interval (which includes the paint
+    Qt does between ticks) over budget, or inference far slower than the
+    budget, drops one level; a sustained stretch comfortably under budget
+    climbs one level back. cooldown seconds must pass between changes so
+    one slow frame never flips the level back and forth.
+    """
+    def __init__(self, target_fps=30, min_level=0, max_level=len(QUALITY_LEVELS) - 1,
+                 cooldown=2.0, upgrade_after=4.0, smoothing=0.1):
+        if not 0 <= min_level <= max_level < len(QUALITY_LEVELS):
+            raise ValueError(f"quality levels must satisfy 0 <= min ({min_level}) <= max ({max_level}) "
+                             f"<= {len(QUALITY_LEVELS) - 1}")
+        self.budget_ms = 1000.0 / target_fps
+        self.min_level = min_level
+        self.max_level = max_level
+        self.level = self.min_level
+        self.cooldown = cooldown
+        self.upgrade_after = upgrade_after
+        self.smoothing = smoothing
+
+        self.interval_ms = self.budget_ms
+        self.inference_ms = 0.0
+        self._last_tick = None
+        self._last_change = 0.0
+        self._good_since = None
+        self.changes = 0
+
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def tick(self, now=None, inference_ms=None):
+        """
+        Returns the new level when it changed, else None.
+        """
+        now = time.monotonic() if now is None else now
+        if self._last_tick is not None:
+            dt_ms = (now - self._last_tick) * 1000.0
+            self.interval_ms += self.smoothing * (dt_ms - self.interval_ms)
+        self._last_tick = now
+        if inference_ms is not None:
+            self.inference_ms = inference_ms
+        if now - self._last_change < self.cooldown:
+            return None
+
+        over = (self.interval_ms > self.budget_ms * 1.15 or
+                self.inference_ms > self.budget_ms * 1.5)
+        if over:
+            self._good_since = None
+            return self._set(self.level + 1, now)
+
+        under = (self.interval_ms < self.budget_ms * 1.05 and
+                 self.inference_ms < self.budget_ms * 0.75)
+        if not under:
+            self._good_since = None
+            return None
+        if self._good_since is None:
+            self._good_since = now
+        if now - self._good_since >= self.upgrade_after:
+            self._good_since = None
+            return self._set(self.level - 1, now)
+        return None
+
+    def _set(self, level, now):
+        level = min(self.max_level, max(self.min_level, level))
+        if level == self.level:
+            return None
+        self.level = level
+        self._last_change = now
+        self.changes += 1
+        return level
+
+    def text(self):
+        return (f"quality L{self.level} ({self.min_level}-{self.max_level}) "
+                f"tick {self.interval_ms:.0f}/{self.budget_ms:.0f} ms")
@@ -0,0 +1,317 @@
+import time
+import multiprocessing as mp_proc
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pipeline import (
+    HandResult, StageStats, FrameRing, HANDS_OPTIONS, NUM_LANDMARKS,
+    RING_LATEST_SLOT, RING_LATEST_ID, landmarks_to_array, prepare_frame
+)
+from tracking import RoiTracker, MotionGate, GATE_RUN, GATE_REUSE
+
+MAX_HANDS = 2
+
+# result meta (int64): seqlock counter, frame id, hands, processed, stale,
+# motion gate counts, and a counter bumped by the UI after each gate region change
+RES_SEQ = 0
+RES_FRAME_ID = 1
+RES_HANDS = 2
+RES_PROCESSED = 3
+RES_STALE = 4
+RES_GATE_RAN = 5
+RES_GATE_REUSED = 6
+RES_GATE_SKIPPED = 7
+RES_REGION_VERSION = 8
+RES_META_LEN = 9
+
+
+class SharedFrameRing(FrameRing):
+    """
+    FrameRing placed in one shared memory block.
+
+    The capture thread mirrors each camera frame straight into a free slot,
+    the worker process maps the same block and reads the newest slot in
+    place. Nothing is pickled.
+    """
+    def __init__(self, width, height, slots=5, name=None):
+        size = FrameRing.nbytes(width, height, slots)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        super().__init__(width, height, slots, buf=self.shm.buf, init=self.owner)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        # drop our numpy views first, SharedMemory.close() refuses otherwise
+        self.header = self.slot_ids = self.slot_ts = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            print("Warning: frame ring still referenced at shutdown")
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedResults:
+    """
+    Latest landmarks as a fixed-size float32 block guarded by a seqlock:
+    the writer bumps the counter to odd, writes, bumps it to even.
+
+    The block also carries the motion gate region the other way, from the
+    UI to the worker; the worker picks it up when RES_REGION_VERSION moves.
+    """
+    def __init__(self, name=None):
+        meta_bytes = 8 * RES_META_LEN
+        lm_bytes = 4 * MAX_HANDS * NUM_LANDMARKS * 3
+        size = meta_bytes + 16 + lm_bytes + 32
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        buf = self.shm.buf
+        self.meta = np.ndarray((RES_META_LEN,), dtype=np.int64, buffer=buf)
+        # timestamp of the source frame, inference ms
+        self.times = np.ndarray((2,), dtype=np.float64, buffer=buf, offset=meta_bytes)
+        self.landmarks = np.ndarray((MAX_HANDS, NUM_LANDMARKS, 3), dtype=np.float32,
+                                    buffer=buf, offset=meta_bytes + 16)
+        # normalised x0, y0, x1, y1 of the motion gate
+        self.region = np.ndarray((4,), dtype=np.float64, buffer=buf, offset=meta_bytes + 16 + lm_bytes)
+        if self.owner:
+            self.meta[:] = 0
+        self.last_seq = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, frame_id, ts, infer_ms, landmarks):
+        n = min(len(landmarks), MAX_HANDS)
+        self.meta[RES_SEQ] += 1
+        self.meta[RES_FRAME_ID] = frame_id
+        self.meta[RES_HANDS] = n
+        self.meta[RES_PROCESSED] += 1
+        self.times[0] = ts
+        self.times[1] = infer_ms
+        if n:
+            self.landmarks[:n] = landmarks[:n]
+        self.meta[RES_SEQ] += 1
+
+    def read(self):
+        """
+        (frame_id, ts, landmarks copy) if there is a result we have not seen, else None.
+        """
+        for _ in range(3):
+            seq = int(self.meta[RES_SEQ])
+            if seq == self.last_seq or seq & 1:
+                return None
+            frame_id = int(self.meta[RES_FRAME_ID])
+            n = int(self.meta[RES_HANDS])
+            ts = float(self.times[0])
+            landmarks = self.landmarks[:n].copy()
+            if int(self.meta[RES_SEQ]) == seq:
+                self.last_seq = seq
+                return frame_id, ts, landmarks
+        return None
+
+    def set_region(self, region):
+        self.region[:] = region
+        self.meta[RES_REGION_VERSION] += 1
+
+    def close(self):
+        self.meta = self.times = self.landmarks = self.region = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(ring_name, results_name, width, height, slots, wake, stop, hands_options,
+                 tracker_options, gate_options=None):
+    """
+    Entry point of the inference process. Imports mediapipe here so the UI
+    process never has to build the hand graph.
+    """
+    import mediapipe as mp
+
+    ring = SharedFrameRing(width, height, slots, name=ring_name)
+    results = SharedResults(name=results_name)
+    hands = mp.solutions.hands.Hands(**hands_options)
+    tracker = RoiTracker(**tracker_options)
+    gate = MotionGate(**gate_options) if gate_options is not None else None
+    landmarks = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+    last_id = 0
+    region_version = 0
+    try:
+        while not stop.is_set():
+            if not wake.wait(0.1):
+                continue
+            wake.clear()
+            frame_id = int(ring.header[RING_LATEST_ID])
+            if frame_id == last_id:
+                continue
+            slot = int(ring.header[RING_LATEST_SLOT])
+            ts = float(ring.slot_ts[slot])
+            t0 = time.perf_counter()
+            if gate is not None and int(results.meta[RES_REGION_VERSION]) != region_version:
+                # keyboard resized or scrolled in the UI
+                region_version = int(results.meta[RES_REGION_VERSION])
+                gate.region = tuple(results.region.tolist())
+            prepared = prepare_frame(ring, slot, frame_id, tracker, gate, len(landmarks) > 0)
+            if gate is not None:
+                results.meta[RES_GATE_RAN] = gate.ran
+                results.meta[RES_GATE_REUSED] = gate.reused
+                results.meta[RES_GATE_SKIPPED] = gate.skipped
+            if prepared is None:
+                # writer lapped us mid-copy, wait for the next frame
+                results.meta[RES_STALE] += 1
+                continue
+            verdict, rgb, transform = prepared
+            last_id = frame_id
+            if verdict != GATE_RUN:
+                # static frame: resend the tracked hands, or nothing at all
+                if verdict == GATE_REUSE:
+                    results.write(frame_id, ts, float(results.times[1]), landmarks)
+                continue
+
+            mp_results = hands.process(rgb)
+            landmarks = tracker.reproject(landmarks_to_array(mp_results)[:MAX_HANDS], transform)
+            tracker.update(landmarks, width, height)
+            infer_ms = (time.perf_counter() - t0) * 1000
+            results.write(frame_id, ts, infer_ms, landmarks)
+    finally:
+        hands.close()
+        ring.close()
+        results.close()
+
+
+class ProcessBackend:
+    """
+    Runs MediaPipe hands in a separate process so inference gets its own
+    core and its own GIL. Frames go over a SharedFrameRing, landmarks come
+    back through SharedResults. The shared blocks are created lazily on the
+    first frame, once the real capture size is known.
+    """
+    def __init__(self, hands_options=None, slots=5, tracker_options=None, gate_options=None):
+        self.hands_options = dict(hands_options or HANDS_OPTIONS)
+        self.tracker_options = dict(tracker_options or {})
+        self.gate_options = dict(gate_options) if gate_options is not None else None
+        self.slots = slots
+        self.ring = None
+        self.results = None
+        self.process = None
+        self.ctx = mp_proc.get_context("spawn")
+        self.wake = self.ctx.Event()
+        self.stop_event = self.ctx.Event()
+
+        self.submit_stats = StageStats("inference_in")
+        self.results_stats = StageStats("results")
+        self._last_processed = 0
+
+    def start(self):
+        # nothing to do until the first frame tells us the size
+        pass
+
+    def _launch(self, width, height):
+        self.ring = SharedFrameRing(width, height, self.slots)
+        self.results = SharedResults()
+        if self.gate_options is not None:
+            self.results.region[:] = self.gate_options.get("region", (0.0, 0.0, 1.0, 1.0))
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.ring.name, self.results.name, width, height, self.slots,
+                  self.wake, self.stop_event, self.hands_options, self.tracker_options,
+                  self.gate_options),
+            name="hand-inference",
+            daemon=True
+        )
+        self.process.start()
+
+    def ring_for(self, width, height):
+        if self.stop_event.is_set():
+            # a capture thread that outlived stop(): no new worker, no new blocks
+            return None
+        if self.ring is None:
+            self._launch(width, height)
+        elif (self.ring.width, self.ring.height) != (width, height):
+            # the worker mapped a fixed size, frames of any other size are dropped
+            self.submit_stats.dropped += 1
+            return None
+        return self.ring
+
+    def set_gate_region(self, region):
+        """
+        New motion gate region; reaches the worker through SharedResults,
+        or with the gate options when it has not started yet.
+        """
+        if self.gate_options is None:
+            return
+        self.gate_options["region"] = tuple(region)
+        if self.results is not None:
+            self.results.set_region(region)
+
+    def submit(self, frame_id, ts, slot):
+        if self.wake.is_set():
+            # worker has not picked up the previous frame yet
+            self.submit_stats.dropped += 1
+        self.submit_stats.processed += 1
+        self.wake.set()
+
+    def poll(self):
+        if self.results is None:
+            return None
+        res = self.results.read()
+        if res is None:
+            return None
+        frame_id, ts, landmarks = res
+        processed = int(self.results.meta[RES_PROCESSED])
+        if self._last_processed and processed > self._last_processed + 1:
+            self.results_stats.dropped += processed - self._last_processed - 1
+        self._last_processed = processed
+        self.results_stats.processed += 1
+        return HandResult(frame_id, ts, self.ring.width, self.ring.height, landmarks)
+
+    def stats(self):
+        infer = StageStats("inference")
+        if self.results is not None:
+            infer.processed = int(self.results.meta[RES_PROCESSED])
+            infer.dropped = int(self.results.meta[RES_STALE])
+            infer.last_ms = float(self.results.times[1])
+        depth = 1 if self.wake.is_set() else 0
+        s = {
+            "inference_in": self.submit_stats.as_dict(depth),
+            "inference": infer.as_dict(0),
+            "results": self.results_stats.as_dict(0),
+        }
+        if self.gate_options is not None:
+            meta = self.results.meta if self.results is not None else np.zeros(RES_META_LEN)
+            s["gate"] = {"ran": int(meta[RES_GATE_RAN]), "reused": int(meta[RES_GATE_REUSED]),
+                         "skipped": int(meta[RES_GATE_SKIPPED])}
+        return s
+
+    def stop(self, timeout=1.0):
+        """
+        Stops the worker and releases both shared memory blocks. Safe to call twice.
+        """
+        self.stop_event.set()
+        self.wake.set()
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout)
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.results is not None:
+            self.results.close()
+            self.results = None
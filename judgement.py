@@ -0,0 +1,99 @@
+import time
+from collections import deque
+
+PERFECT = "perfect"
+GOOD = "good"
+MISS = "miss"
+STRAY = "stray"  # press with no target anywhere near
+
+POINTS = {PERFECT: 10, GOOD: 5, MISS: -2, STRAY: -5}
+
+
+class JudgementEngine:
+    """
+    Scores key presses against the times tiles reach their keys.
+
+    Targets sit in a deque per note plus one deque for expiry, both in
+    beat order, so a press only looks at the front of its note's deque and
+    expire() only looks at the front of the global one: constant work per
+    event however dense the song gets. All times are time.monotonic()
+    seconds. latency_ms is subtracted from every press to cancel the delay
+    between a finger landing and the press reaching us.
+    """
+    def __init__(self, perfect_ms=50, good_ms=120, miss_ms=250, latency_ms=0.0,
+                 clock=time.monotonic):
+        self.perfect = perfect_ms / 1000.0
+        self.good = good_ms / 1000.0
+        self.miss = miss_ms / 1000.0
+        self.latency = latency_ms / 1000.0
+        self.clock = clock
+        self.by_note = {}
+        self.expiry = deque()
+        self.counts = dict((k, 0) for k in POINTS)
+        self.errors_ms = deque(maxlen=64)  # signed, of recent perfect/good hits
+
+    def reset(self):
+        self.by_note.clear()
+        self.expiry.clear()
+
+    def add_target(self, note, beat):
+        # [beat, note, judged]; shared by both deques
+        target = [beat, note, False]
+        self.by_note.setdefault(note, deque()).append(target)
+        self.expiry.append(target)
+
+    def press(self, note, at=None):
+        """
+        Judges a press of `note` made at monotonic time `at` (default now).
+        Returns PERFECT, GOOD, MISS or STRAY.
+        """
+        t = (self.clock() if at is None else at) - self.latency
+        pending = self.by_note.get(note)
+        # targets already judged or expired stay queued until they reach the front
+        while pending and (pending[0][2] or pending[0][0] + self.miss < t):
+            pending.popleft()
+        if not pending or pending[0][0] - self.miss > t:
+            return self._count(STRAY)
+
+        target = pending.popleft()
+        target[2] = True
+        err = t - target[0]
+        if abs(err) <= self.perfect:
+            verdict = PERFECT
+        elif abs(err) <= self.good:
+            verdict = GOOD
+        else:
+            return self._count(MISS)
+        self.errors_ms.append(err * 1000.0)
+        return self._count(verdict)
+
+    def expire(self, now=None):
+        """
+        Retires targets nobody pressed in time. Returns how many were missed.
+        """
+        t = (self.clock() if now is None else now) - self.latency
+        missed = 0
+        while self.expiry and self.expiry[0][0] + self.miss < t:
+            target = self.expiry.popleft()
+            if not target[2]:
+                target[2] = True
+                missed += 1
+        self.counts[MISS] += missed
+        return missed
+
+    def _count(self, verdict):
+        self.counts[verdict] += 1
+        return verdict
+
+    def suggested_latency_ms(self):
+        """
+        Latency that would centre recent hits on the beat (the current
+        offset plus their median error), or None without enough hits.
+        """
+        if len(self.errors_ms) < 8:
+            return None
+        errs = sorted(self.errors_ms)
+        return self.latency * 1000.0 + errs[len(errs) // 2]
+
+    def stats(self):
+        return dict(self.counts, latency_ms=self.latency * 1000.0)
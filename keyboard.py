@@ -0,0 +1,190 @@
+import numpy as np
+
+
+class KeyHitIndex:
+    """
+    Per-pixel-column lookup of which white and which black key covers each x.
+
+    Built once from the key rects; query() answers every fingertip in one
+    vectorised call. Black keys sit on top of white keys, so a point inside a
+    black key never reports the white key underneath.
+    """
+    def __init__(self, keys, width):
+        """
+        keys: list of (note_name, (x, y, w, h), is_black) in window pixels.
+        width: window width, i.e. number of columns to index.
+        """
+        self.width = max(1, int(width))
+        self.names = [nm for (nm, _, _) in keys]
+        n = len(keys)
+        self.top = np.empty(n, dtype=np.int32)
+        self.bottom = np.empty(n, dtype=np.int32)
+        self.white_col = np.full(self.width, -1, dtype=np.int32)
+        self.black_col = np.full(self.width, -1, dtype=np.int32)
+
+        for i, (_, (x, y, w, h), is_black) in enumerate(keys):
+            # inclusive edges, same as QRect.left()..right()
+            self.top[i] = y
+            self.bottom[i] = y + h - 1
+            x0 = max(0, x)
+            x1 = min(self.width, x + w)
+            if x1 <= x0:
+                continue
+            cols = self.black_col if is_black else self.white_col
+            cols[x0:x1] = i
+
+    def query(self, points):
+        """
+        points: (N, 2) array of (x, y) pixels. Returns (N,) key indices, -1 for no key.
+        """
+        pts = np.asarray(points)
+        if len(pts) == 0:
+            return np.empty(0, dtype=np.int32)
+        if not self.names:
+            return np.full(len(pts), -1, dtype=np.int32)
+        x = pts[:, 0].astype(np.int64)
+        y = pts[:, 1].astype(np.int64)
+        inside = (x >= 0) & (x < self.width)
+        cols = np.clip(x, 0, self.width - 1)
+
+        out = np.full(len(pts), -1, dtype=np.int32)
+
+        w = self.white_col[cols]
+        w_hit = inside & (w >= 0)
+        w_safe = np.where(w_hit, w, 0)
+        w_hit &= (y >= self.top[w_safe]) & (y <= self.bottom[w_safe])
+        out[w_hit] = w[w_hit]
+
+        b = self.black_col[cols]
+        b_hit = inside & (b >= 0)
+        b_safe = np.where(b_hit, b, 0)
+        b_hit &= (y >= self.top[b_safe]) & (y <= self.bottom[b_safe])
+        out[b_hit] = b[b_hit]
+        return out
+
+    def query_names(self, points):
+        """
+        Set of note names touched by any of the points.
+        """
+        return {self.names[i] for i in np.unique(self.query(points)) if i >= 0}
+
+
+class PressDetector:
+    """
+    Per-finger strike detection with note velocity.
+
+    Every finger keeps a short history of fingertip height and depth; a
+    least-squares slope over it gives the downward and toward-camera speed.
+    A finger presses a key when it is extended and over the key (the old
+    rule) or, one frame earlier, when it is striking down fast enough that
+    its next-frame position lands on a key. It lets go once neither its
+    current nor its predicted position is on that key, or it bends or
+    disappears; release_margin pixels of slack above the key keep a finger
+    resting on the top edge from retriggering. A key sounds while any
+    finger holds it.
+
+    Speeds are in pixels per second; velocity maps strike speed between
+    min_speed and max_speed onto min_velocity..1.
+    """
+    def __init__(self, names, fingers, history=4, strike_speed=250.0, min_speed=80.0,
+                 max_speed=1500.0, min_velocity=0.25, depth_weight=0.5, frame_dt=1/30.0,
+                 release_margin=6):
+        self.names = names
+        self.held = {nm: False for nm in names}
+        self.holders = np.zeros(len(names), dtype=np.int32)
+        self.finger_key = np.full(fingers, -1, dtype=np.int32)
+        self.strike_speed = strike_speed
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.min_velocity = min_velocity
+        self.depth_weight = depth_weight
+        self.frame_dt = frame_dt
+        self.release_margin = release_margin
+
+        self.t = np.zeros(history)
+        self.y = np.zeros((fingers, history))
+        self.z = np.zeros((fingers, history))
+        self.valid = np.zeros((fingers, history), dtype=bool)
+        self.pos = 0
+
+        self.presses = 0
+        self.releases = 0
+        self.early = 0  # presses caught before the tip reached the key
+
+    def _slopes(self):
+        w = self.valid.astype(np.float64)
+        n = w.sum(axis=1)
+        tm = (w * self.t).sum(axis=1) / np.maximum(n, 1)
+        dt = (self.t - tm[:, None]) * w
+        den = (dt * dt).sum(axis=1)
+        ok = (n >= 2) & (den > 0)
+        den = np.where(ok, den, 1.0)
+        vy = np.where(ok, (dt * self.y).sum(axis=1) / den, 0.0)
+        vz = np.where(ok, (dt * self.z).sum(axis=1) / den, 0.0)
+        return vy, vz
+
+    def velocity(self, speed):
+        frac = np.clip((speed - self.min_speed) / (self.max_speed - self.min_speed), 0.0, 1.0)
+        return self.min_velocity + (1.0 - self.min_velocity) * frac
+
+    def update(self, t, tips, depth, extended, present, hit_index):
+        """
+        tips: (fingers, 2) pixels, depth: (fingers,) pixels (negative =>
+        toward the camera), extended/present: (fingers,) bool.
+
+        Returns (note_ons [(name, velocity)], note_offs [name]).
+        """
+        k = self.pos % len(self.t)
+        self.pos += 1
+        self.t[k] = t
+        self.y[:, k] = tips[:, 1]
+        self.z[:, k] = depth
+        self.valid[~present] = False  # a finger that vanished starts over
+        self.valid[present, k] = True
+        vy, vz = self._slopes()
+
+        ahead = tips.astype(np.float64)
+        ahead[:, 1] = np.rint(ahead[:, 1] + vy * self.frame_dt)
+        key_now = hit_index.query(tips)
+        key_next = hit_index.query(ahead)
+        slack = tips.astype(np.float64)
+        slack[:, 1] += self.release_margin
+        key_hold = hit_index.query(slack)
+        key_now[~present] = -1
+        key_next[~present] = -1
+
+        down = self.finger_key >= 0
+        off_key = ((key_now != self.finger_key) & (key_next != self.finger_key) &
+                   (key_hold != self.finger_key))
+        release = down & (~present | ~extended | off_key)
+        free = ~down | release
+        on_key = free & present & extended & (key_now >= 0)
+        striking = (free & present & extended & ~on_key & (key_next >= 0) &
+                    (vy >= self.strike_speed))
+        new_key = np.where(on_key, key_now, np.where(striking, key_next, -1))
+
+        offs = []
+        for f in np.flatnonzero(release):
+            key = self.finger_key[f]
+            self.finger_key[f] = -1
+            self.holders[key] -= 1
+            if self.holders[key] == 0 and not (new_key == key).any():
+                self.held[self.names[key]] = False
+                offs.append(self.names[key])
+
+        ons = []
+        if on_key.any() or striking.any():
+            speed = np.maximum(vy, 0.0) + self.depth_weight * np.maximum(-vz, 0.0)
+            vel = self.velocity(speed)
+            for f in np.flatnonzero(new_key >= 0):
+                key = new_key[f]
+                self.finger_key[f] = key
+                self.holders[key] += 1
+                name = self.names[key]
+                if not self.held[name]:
+                    self.held[name] = True
+                    ons.append((name, float(vel[f])))
+                    self.early += int(striking[f])
+        self.presses += len(ons)
+        self.releases += len(offs)
+        return ons, offs
@@ -0,0 +1,179 @@
+import numpy as np
+
+from songs import midi_to_name, name_to_midi
+
+# a full piano: A0 .. C8
+LOWEST_KEY = 21
+HIGHEST_KEY = 108
+MIDDLE_C = 60
+BLACK_PITCH_CLASSES = (1, 3, 6, 8, 10)
+
+# keyboard shortcuts for two octaves up from a C: the white keys, then the
+# black keys (C#, D#, F#, G#, A#, twice)
+SHORTCUT_WHITE_KEYS = ("Q", "W", "E", "R", "T", "Y", "U", "I", "O", "P", "[", "]", "\\", "1")
+SHORTCUT_BLACK_KEYS = ("2", "3", "5", "6", "7", "8", "9", "0", "-", "=")
+SHORTCUT_KEYS = SHORTCUT_WHITE_KEYS + SHORTCUT_BLACK_KEYS
+
+
+def is_black_key(midi):
+    return midi % 12 in BLACK_PITCH_CLASSES
+
+
+def parse_key_range(text):
+    """
+    "c4-b5" or "a0-c8" => (low midi, high midi), widened to whole white
+    keys at both ends and clipped to the 88 piano keys.
+    """
+    low, high = (name_to_midi(part.strip()) for part in text.split("-", 1))
+    if low > high:
+        low, high = high, low
+    low, high = max(LOWEST_KEY, low), min(HIGHEST_KEY, high)
+    if is_black_key(low):
+        low -= 1
+    if is_black_key(high):
+        high += 1
+    return low, high
+
+
+class KeyboardLayout:
+    """
+    Key geometry for any contiguous range of piano keys, up to all 88.
+
+    Names, MIDI numbers and colours are fixed when the layout is built;
+    fit() places every key for a window size in one vectorised pass.
+    Keys are ordered white keys first, then black keys (both low to high),
+    so painting in order puts black keys on top and indices stay stable
+    across fit() and scroll() calls.
+
+    White keys share the width evenly with half a key of margin on both
+    sides. When that would make them narrower than min_key_w the keyboard
+    keeps min_key_w and shows a window of it instead, which scroll() moves;
+    keys outside it are laid out off screen, so they keep their index but
+    never paint or hit.
+
+    The SHORTCUT_KEYS cover two octaves from a C on screen, so
+    they follow the range and the scroll position. `shortcuts` (name =>
+    key) and `shortcut_notes` (key => name) are updated in place.
+    """
+    def __init__(self, low=name_to_midi("c4"), high=name_to_midi("b5"), min_key_w=40):
+        midi = np.arange(low, high + 1)
+        black = np.array([is_black_key(m) for m in midi])
+        order = np.concatenate([np.flatnonzero(~black), np.flatnonzero(black)])
+        self.midi = midi[order]
+        self.is_black = black[order]
+        self.names = [midi_to_name(int(m)) for m in self.midi]
+        self.index = dict((nm, i) for i, nm in enumerate(self.names))
+        self.shortcuts = {}
+        self.shortcut_notes = {}
+
+        # position in white-key widths from the lowest key; a black key sits
+        # 0.7 of a white key past the white key below it
+        whites_below = np.cumsum(~black) - 1
+        slot = whites_below.astype(np.float64)
+        slot[black] += 0.7
+        self.slot = slot[order]
+        self.num_white = int(np.count_nonzero(~black))
+        self.min_key_w = min_key_w
+
+        self.key_w = 0.0
+        self.visible_white = self.num_white
+        self.scroll_pos = 0
+        n = len(self.names)
+        self.x = np.zeros(n, dtype=np.int32)
+        self.y = np.zeros(n, dtype=np.int32)
+        self.w = np.zeros(n, dtype=np.int32)
+        self.h = np.zeros(n, dtype=np.int32)
+        self.x_start = 0.0
+        self.total_w = 0.0
+        self.width = self.height = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def fit(self, width, height):
+        self.width, self.height = width, height
+        key_w = width / float(self.num_white + 1)
+        self.visible_white = self.num_white
+        if key_w < self.min_key_w:
+            key_w = float(self.min_key_w)
+            self.visible_white = max(1, int(width / key_w) - 1)
+        # a wider window shows more keys: the old position may now run past the end
+        self.scroll_pos = self._clamp(self.scroll_pos)
+        if self.scroll_pos == 0 and self.num_white > self.visible_white:
+            self._center_on(MIDDLE_C)
+        self.key_w = key_w
+        self._place()
+
+    def scroll(self, whites):
+        """
+        Moves the visible window by `whites` white keys. True if it moved.
+        """
+        pos = self._clamp(self.scroll_pos + whites)
+        if pos == self.scroll_pos:
+            return False
+        self.scroll_pos = pos
+        self._place()
+        return True
+
+    def _clamp(self, pos):
+        return int(min(max(0, pos), self.num_white - self.visible_white))
+
+    def _center_on(self, midi):
+        i = self.index.get(midi_to_name(midi))
+        if i is not None:
+            self.scroll_pos = self._clamp(int(self.slot[i]) - self.visible_white // 2)
+
+    def _place(self):
+        key_w, width, height = self.key_w, self.width, self.height
+        self.total_w = self.visible_white * key_w
+        self.x_start = (width - self.total_w) / 2
+        x0 = self.x_start - self.scroll_pos * key_w
+        white_h = height / 3.0
+        white_y = height - white_h - height * 0.20
+
+        black = self.is_black
+        self.x[:] = (x0 + self.slot * key_w).astype(np.int32)
+        self.y[:] = int(white_y)
+        self.w[:] = np.where(black, int(key_w * 0.5), int(key_w))
+        self.h[:] = np.where(black, int(height / 4.5), int(white_h))
+        self._assign_shortcuts()
+
+    def _assign_shortcuts(self):
+        # whites come first in key order, so the visible ones are a slice
+        first = self.scroll_pos
+        last = min(self.num_white, first + self.visible_white) - 1
+        low, high = int(self.midi[first]), int(self.midi[last])
+        # the C on screen nearest middle C that has both octaves on screen,
+        # else the first C on screen, else the C below the screen
+        cs = list(range(low + (-low) % 12, high + 1, 12))
+        whole = [c for c in cs if c + 23 <= high]
+        if whole:
+            base = min(whole, key=lambda c: abs(c - MIDDLE_C))
+        else:
+            base = cs[0] if cs else low - low % 12
+        self.shortcuts.clear()
+        self.shortcut_notes.clear()
+        whites = iter(SHORTCUT_WHITE_KEYS)
+        blacks = iter(SHORTCUT_BLACK_KEYS)
+        for midi in range(base, base + 24):
+            key = next(blacks) if is_black_key(midi) else next(whites)
+            if low <= midi <= high:
+                name = midi_to_name(midi)
+                self.shortcuts[name] = key
+                self.shortcut_notes[key] = name
+
+    def rects(self):
+        """
+        (name, (x, y, w, h)) per key, in key order.
+        """
+        return list(zip(self.names, zip(self.x.tolist(), self.y.tolist(),
+                                        self.w.tolist(), self.h.tolist())))
+
+    def bounds(self):
+        """
+        (left, top, right, bottom) of the visible keyboard in pixels, inclusive.
+        """
+        left = int(self.x_start)
+        top = int(self.y.min()) if len(self) else 0
+        bottom = int((self.y + self.h).max()) - 1 if len(self) else 0
+        return left, top, int(self.x_start + self.total_w) - 1, bottom
@@ -0,0 +1,229 @@
+import csv
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    song TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    played_at REAL NOT NULL,
+    perfect INTEGER NOT NULL DEFAULT 0,
+    good INTEGER NOT NULL DEFAULT 0,
+    miss INTEGER NOT NULL DEFAULT 0,
+    stray INTEGER NOT NULL DEFAULT 0,
+    source TEXT  -- CSV a row was imported from, NULL for played runs
+);
+CREATE INDEX IF NOT EXISTS runs_song_score ON runs (song, score DESC);
+CREATE INDEX IF NOT EXISTS runs_player_song_score ON runs (player, song, score DESC);
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    read_bytes INTEGER NOT NULL DEFAULT 0,
+    prefix_sha1 TEXT  -- of the first read_bytes bytes
+);
+"""
+
+# columns added after the first release: (table, column, declaration, fill for old rows)
+ADDED_COLUMNS = (
+    ("imports", "read_bytes", "INTEGER NOT NULL DEFAULT 0", "size"),  # files were read to the end
+    ("imports", "prefix_sha1", "TEXT", None),
+    ("runs", "source", "TEXT", None),
+)
+
+_STOP = object()
+
+
+class Leaderboard:
+    """
+    Song results in SQLite (WAL mode), written from a background thread.
+
+    record() and import_csv() only queue work; the writer thread drains
+    the queue in batches of up to batch_size rows per transaction, so the
+    GUI never touches the disk to save a result. Queries run on a
+    per-thread read connection: WAL readers never wait on the writer, and
+    both top() and personal_best() are single index range scans, so they
+    stay in the millisecond range however long the history gets.
+    A result only shows up in queries once the writer has committed it.
+    """
+    def __init__(self, path, batch_size=256, flush_interval=0.25):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._run, name="leaderboard", daemon=True)
+        self._writer.start()
+
+    # -- writes (any thread, never block) --
+
+    def record(self, player, song, score, counts=None, played_at=None):
+        counts = counts or {}
+        self._queue.put(("run", (player, song, int(score),
+                                 time.time() if played_at is None else played_at,
+                                 counts.get("perfect", 0), counts.get("good", 0),
+                                 counts.get("miss", 0), counts.get("stray", 0), None)))
+
+    def import_csv(self, path):
+        """
+        Queues rows of `player,song,score` for import. When the part read
+        last time is unchanged only the appended rows are imported;
+        otherwise the file was rewritten and its rows replace the ones
+        imported from it before.
+        """
+        self._queue.put(("csv", path))
+
+    def flush(self, timeout=5.0):
+        """
+        Waits until everything queued so far is committed (tests, shutdown).
+        """
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # -- reads (caller's thread) --
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql, args):
+        try:
+            return self._reader().execute(sql, args).fetchall()
+        except sqlite3.OperationalError:
+            return []  # writer has not created the tables yet
+
+    def top(self, song, n=10):
+        """
+        [(player, score, played_at)] best first; ties go to the earlier run.
+        """
+        return self._query(
+            "SELECT player, score, played_at FROM runs WHERE song = ? "
+            "ORDER BY score DESC, played_at LIMIT ?", (song, n))
+
+    def personal_best(self, player, song):
+        """
+        Highest score `player` has on `song`, or None.
+        """
+        rows = self._query(
+            "SELECT score FROM runs WHERE player = ? AND song = ? "
+            "ORDER BY score DESC LIMIT 1", (player, song))
+        return rows[0][0] if rows else None
+
+    # -- writer thread --
+
+    def _run(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        for table, column, decl, fill in ADDED_COLUMNS:
+            if column not in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+                with conn:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+                    if fill is not None:
+                        conn.execute(f"UPDATE {table} SET {column} = {fill}")
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            runs = []
+            imported = []
+            rewritten = []
+            waiting = []
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                elif item[0] == "run":
+                    runs.append(item[1])
+                elif item[0] == "csv":
+                    if any(m[0] == os.path.abspath(item[1]) for m in imported):
+                        continue  # queued twice in one batch
+                    rows, marker, replace = self._read_csv(conn, item[1])
+                    runs.extend(rows)
+                    if marker is not None:
+                        imported.append(marker)
+                    if replace:
+                        rewritten.append((marker[0],))
+                else:
+                    waiting.append(item[1])
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM runs WHERE source = ?", rewritten)
+                    conn.executemany(
+                        "INSERT INTO runs (player, song, score, played_at, perfect, good, miss, stray, source) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", runs)
+                    # same transaction, so a failed insert is imported again next time
+                    conn.executemany("INSERT OR REPLACE INTO imports "
+                                     "(path, size, mtime_ns, read_bytes, prefix_sha1) "
+                                     "VALUES (?, ?, ?, ?, ?)", imported)
+                self.written += len(runs)
+            except sqlite3.Error as e:
+                self.failed += len(runs)
+                print(f"Warning: could not save {len(runs)} leaderboard results: {e}")
+            for done in waiting:
+                done.set()
+        conn.close()
+
+    def _read_csv(self, conn, path):
+        """
+        (rows, imports row, replace) for the part of a CSV not imported yet.
+        replace: the file was rewritten, drop what was imported from it
+        before. ([], None, False) when nothing changed.
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return [], None, False
+        seen = conn.execute("SELECT size, mtime_ns, read_bytes, prefix_sha1 FROM imports WHERE path = ?",
+                            (path,)).fetchone()
+        if seen is not None and seen[:2] == (st.st_size, st.st_mtime_ns):
+            return [], None, False
+        start = 0
+        replace = seen is not None
+        if seen is not None and len(data) >= seen[2]:
+            prefix = hashlib.sha1(data[:seen[2]]).hexdigest()
+            # no hash: imported before hashes were kept, trust the byte count
+            if seen[3] is None or seen[3] == prefix:
+                start, replace = seen[2], False  # appended to => only the new lines
+        rows = []
+        for row in csv.reader(data[start:].decode("utf-8", "replace").splitlines()):
+            if len(row) < 3:
+                continue
+            try:
+                score = int(row[2])
+            except ValueError:
+                continue  # header or damaged line
+            rows.append((row[0].strip(), row[1].strip(), score, st.st_mtime, 0, 0, 0, 0, path))
+        marker = (path, st.st_size, st.st_mtime_ns, len(data), hashlib.sha1(data).hexdigest())
+        return rows, marker, replace
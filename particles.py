@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class ParticlePool:
+    """
+    Fixed number of particle slots, reused forever.
+
+    spawn() takes a free slot or, when `limit` particles are live, evicts
+    the oldest one. limit can be lowered at runtime to shed paint work.
+    Positions are a function of elapsed time, so a single step() per
+    frame moves everything regardless of timer jitter.
+    """
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.limit = capacity
+        self.x0 = np.zeros(capacity, dtype=np.float32)
+        self.y0 = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.t0 = np.zeros(capacity, dtype=np.float64)
+        self.lifetime = np.zeros(capacity, dtype=np.float32)
+        self.sprite = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+
+        self.spawned = 0
+        self.evicted = 0
+        self.peak = 0
+
+    def spawn(self, x, y, vx, vy, sprite, now, lifetime=1.0):
+        """
+        Velocities in pixels per second, lifetime in seconds. Returns the slot used.
+        """
+        free = np.flatnonzero(~self.alive)
+        if len(free) and self.capacity - len(free) < self.limit:
+            i = int(free[0])
+        else:
+            i = int(np.argmin(np.where(self.alive, self.t0, np.inf)))
+            self.evicted += 1
+        self.x0[i] = self.x[i] = x
+        self.y0[i] = self.y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.t0[i] = now
+        self.lifetime[i] = lifetime
+        self.sprite[i] = sprite
+        self.alive[i] = True
+        self.spawned += 1
+        self.peak = max(self.peak, self.live_count())
+        return i
+
+    def step(self, now):
+        """
+        Moves live particles to time `now`, retires expired ones. Returns live count.
+        """
+        age = now - self.t0
+        self.alive &= age < self.lifetime
+        self.x[:] = self.x0 + self.vx * age
+        self.y[:] = self.y0 + self.vy * age
+        return self.live_count()
+
+    def live(self):
+        return np.flatnonzero(self.alive)
+
+    def live_count(self):
+        return int(np.count_nonzero(self.alive))
+
+    def set_limit(self, limit):
+        """
+        Caps live particles at limit (<= capacity), retiring the oldest extras.
+        """
+        self.limit = max(1, min(self.capacity, limit))
+        live = np.flatnonzero(self.alive)
+        if len(live) > self.limit:
+            oldest = live[np.argsort(self.t0[live])[:len(live) - self.limit]]
+            self.alive[oldest] = False
+
+    def stats(self):
+        return {"live": self.live_count(), "capacity": self.limit, "peak": self.peak,
+                "spawned": self.spawned, "evicted": self.evicted}
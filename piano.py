@@ -1,249 +1,591 @@
+import time
+STARTED_AT = time.perf_counter()  # --profile-startup measures from here
+
+import os
 import sys
-import cv2
-import mediapipe as mp
-import pygame
+import argparse
 import random
 import math
-import time
+import threading
+import wave
+import numpy as np
+
+from audio import AudioEngine, AudioOutput
+from keyboard import KeyHitIndex, PressDetector
+from tiles import TileEngine
+from particles import ParticlePool
+from scheduler import MelodyScheduler
+from songs import SongLibrary
+from judgement import JudgementEngine, POINTS, MISS
+from pipeline import FramePipeline, ThreadBackend, AllocMeter, HANDS_OPTIONS, HAND_CONNECTIONS
+from hand_worker import ProcessBackend, MAX_HANDS
+from tracking import INFERENCE_MODES
+from replay import LandmarkRecorder, LandmarkRecording, ReplayPipeline
+from profiler import StageProfiler, StartupProfile
+from assets import AssetLoader, SOUNDS_DIR, IMAGES_DIR, CACHE_DIR
+from samplebank import SampleBank
+from leaderboard import Leaderboard
+from recorder import SessionRecorder, SOURCE_HAND, SOURCE_KEY, SOURCE_TILE
+from layout import KeyboardLayout, parse_key_range, SHORTCUT_KEYS
+from smoothing import OneEuroLandmarks
+from governor import QualityGovernor, QUALITY_LEVELS, clamp_target_fps, tick_interval_ms
 
 from PyQt5.QtGui import (
-    QImage, QPixmap, QGuiApplication, QPainter, QPen, QColor
+    QImage, QPixmap, QGuiApplication, QPainter, QPen, QColor, QBrush,
+    QFont, QKeySequence
 )
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QStatusBar,
-    QComboBox, QSlider
+    QComboBox, QSlider, QWidget, QShortcut
 )
 from PyQt5.QtCore import (
-    QTimer, QRect, Qt, QPoint
+    QTimer, QRect, Qt, QPoint, pyqtSignal
 )
 
-class SkeletonOverlay(QLabel):
+class Layer:
     """
-    A transparent overlay widget that draws the hand skeleton on top of everything (piano + camera).
+    One slice of the Compositor. A layer keeps its own state, tells the
+    compositor which rect changed via invalidate() and paints only when
+    asked. Layers are painted in the order they were added.
+    """
+    name = "layer"
+
+    def __init__(self, compositor):
+        self.compositor = compositor
+
+    def invalidate(self, rect=None):
+        self.compositor.invalidate(rect)
+
+    def paint(self, painter, dirty):
+        pass
+
+class Compositor(QWidget):
+    """
+    Single full-screen surface that replaces the stacked transparent overlays.
+    Every layer paints into the same QPainter, and Qt only hands us the
+    union of the rects layers invalidated, so static regions stay untouched.
     """
     def __init__(self, parent, width, height):
         super().__init__(parent)
         self.setGeometry(0, 0, width, height)
-        self.setStyleSheet("background: transparent;")
-        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
-
-        self.skeleton_data = []
-        self.points_data = []
+        # camera layer covers every pixel => no background erase needed
+        self.setAttribute(Qt.WA_OpaquePaintEvent, True)
+
+        self.layers = []
+        self.paint_ms = {}
+        self.painted_px = 0
+        self.paints = 0
+        self.profiler = None
+
+    def add_layer(self, layer):
+        self.layers.append(layer)
+        self.paint_ms[layer.name] = 0.0
+        return layer
+
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.update()
+        elif not rect.isEmpty():
+            self.update(rect)
 
     def paintEvent(self, event):
-        super().paintEvent(event)
+        dirty = event.rect()
         painter = QPainter(self)
+        for layer in self.layers:
+            t0 = time.perf_counter()
+            painter.save()
+            layer.paint(painter, dirty)
+            painter.restore()
+            t1 = time.perf_counter()
+            ms = (t1 - t0) * 1000
+            if self.profiler is not None:
+                self.profiler.complete("paint:" + layer.name, t0, t1)
+            # smoothed so the breakdown is readable once a second
+            self.paint_ms[layer.name] = 0.9*self.paint_ms[layer.name] + 0.1*ms
+        self.painted_px += sum(r.width()*r.height() for r in event.region().rects())
+        self.paints += 1
+
+    def mousePressEvent(self, event):
+        for layer in reversed(self.layers):
+            handler = getattr(layer, "mouse_press", None)
+            if handler is not None and handler(event.pos()):
+                return
+        super().mousePressEvent(event)
+
+    def take_paint_stats(self):
+        """
+        (paints, fraction of the screen repainted per paint) since the last call.
+        """
+        paints, px = self.paints, self.painted_px
+        self.paints = 0
+        self.painted_px = 0
+        area = max(1, self.width()*self.height())
+        return paints, (px / float(paints*area) if paints else 0.0)
+
+    def breakdown_text(self):
+        return " ".join(f"{nm} {ms:.1f}" for nm, ms in self.paint_ms.items())
+
+class CameraLayer(Layer):
+    """
+    Camera frame as the background, black until the first frame arrives.
+
+    The QImage wraps the capture ring slot directly; no QPixmap conversion or
+    pre-scaled copy is made. Scaling (if the frame is not already window
+    sized) happens while painting, and only over the dirty area.
+    """
+    name = "camera"
+
+    def __init__(self, compositor, smooth=True):
+        super().__init__(compositor)
+        self.smooth = smooth
+        self.image = None
+        self.frame = None
+
+    def set_frame(self, frame):
+        """
+        frame: HxWx3 BGR array that stays valid until the next set_frame().
+        """
+        # QImage does not own the memory => keep the array referenced
+        self.frame = frame
+        if frame is None:
+            self.image = None
+        else:
+            h, w, _ = frame.shape
+            self.image = QImage(frame.data, w, h, w*3, QImage.Format_BGR888)
+        self.invalidate()
+
+    def paint(self, painter, dirty):
+        if self.image is None:
+            painter.fillRect(dirty, Qt.black)
+        elif self.image.size() == self.compositor.size():
+            painter.drawImage(dirty, self.image, dirty)
+        else:
+            if self.smooth:
+                painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(self.compositor.rect(), self.image)
+
+class SkeletonLayer(Layer):
+    """
+    Draws the hand skeleton on top of piano + camera.
+    """
+    name = "skeleton"
+
+    def __init__(self, compositor):
+        super().__init__(compositor)
+        self.skeleton_data = []
+        self.points_data = []
+        self.bounds = QRect()
+
+        self.pen_line = QPen(QColor(255, 255, 255, 200), 3)
+        self.pen_points = QPen(QColor(255, 0, 0, 200), 6)
+
+    def set_data(self, lines, points):
+        # old and new skeleton both need repainting
+        self.invalidate(self.bounds)
+        self.skeleton_data = lines
+        self.points_data = points
+        self.bounds = QRect()
+        if points:
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            # pad by the point pen width
+            self.bounds = QRect(QPoint(min(xs) - 4, min(ys) - 4), QPoint(max(xs) + 4, max(ys) + 4))
+        self.invalidate(self.bounds)
+
+    def paint(self, painter, dirty):
+        if not self.points_data or not self.bounds.intersects(dirty):
+            return
         painter.setRenderHint(QPainter.Antialiasing)
 
         # Skeleton lines in white
-        pen_line = QPen(QColor(255, 255, 255, 200), 3)
-        painter.setPen(pen_line)
+        painter.setPen(self.pen_line)
         for line in self.skeleton_data:
             (x1, y1), (x2, y2) = line
             painter.drawLine(QPoint(x1, y1), QPoint(x2, y2))
 
         # Landmarks in red
-        pen_points = QPen(QColor(255, 0, 0, 200), 6)
-        painter.setPen(pen_points)
+        painter.setPen(self.pen_points)
         for (px, py) in self.points_data:
             painter.drawPoint(QPoint(px, py))
 
-class FlyingNote(QLabel):
+def decode_sprite(path, scale=1.0):
     """
-    Displays a random note image that moves for ~1 second, then self-destructs.
+    A note image at `scale` as premultiplied ARGB32 pixels (h, w, 4).
+    QImage only, so it is safe on a loader thread.
     """
-    def __init__(self, parent, pixmap, start_x, start_y):
-        super().__init__(parent)
-        self.setStyleSheet("background: transparent;")
-        self.setPixmap(pixmap)
-        self.move(start_x, start_y)
-        self.show()
+    img = QImage(path)
+    if img.isNull():
+        raise ValueError(f"could not decode {path}")
+    sw = int(img.width()*scale)
+    sh = int(img.height()*scale)
+    img = img.scaled(sw, sh, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    img = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    w, h = img.width(), img.height()
+    ptr = img.constBits()
+    ptr.setsize(img.bytesPerLine() * h)
+    rows = np.frombuffer(ptr, dtype=np.uint8).reshape(h, img.bytesPerLine())
+    return rows[:, :w * 4].reshape(h, w, 4).copy()
+
+
+def pixels_to_pixmap(pixels):
+    h, w = pixels.shape[:2]
+    data = np.ascontiguousarray(pixels).tobytes()
+    # fromImage copies, so `data` only has to outlive this call
+    return QPixmap.fromImage(QImage(data, w, h, w * 4, QImage.Format_ARGB32_Premultiplied))
+
+
+class NoteSpriteCache:
+    """
+    Every note image pre-scaled once to a fixed set of sizes, so spawning a
+    flying note never has to call QPixmap.scaled(). The sprites come in
+    already scaled: decode_sprite() per image and scale.
+    """
+    SCALES = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2)
 
-        self.lifetime_ms = 1000
-        self.elapsed_ms = 0
+    def __init__(self, sprites):
+        self.sprites = list(sprites)
 
-        angle = random.uniform(0, 2*math.pi)
-        speed = random.uniform(1.0, 3.0)
-        self.vx = speed*math.cos(angle)
-        self.vy = speed*math.sin(angle)
-
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.update_position)
-        self.update_timer.start(33)
-
-    def update_position(self):
-        self.elapsed_ms += 33
-        if self.elapsed_ms >= self.lifetime_ms:
-            self.update_timer.stop()
-            self.deleteLater()
-            return
+    def __len__(self):
+        return len(self.sprites)
 
-        nx = self.x() + self.vx
-        ny = self.y() + self.vy
-        self.move(int(nx), int(ny))
+    def random_sprite(self):
+        return random.randrange(len(self.sprites))
 
-class EffectOverlay(QLabel):
+class EffectLayer(Layer):
     """
-    Transparent overlay above skeleton to hold FlyingNotes.
+    Flying notes: a fixed ParticlePool stepped once per frame, every live
+    particle drawn in one paint pass.
     """
-    def __init__(self, parent, width, height):
-        super().__init__(parent)
-        self.setGeometry(0, 0, width, height)
-        self.setStyleSheet("background: transparent;")
-        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+    name = "effects"
+
+    def __init__(self, compositor, sprite_cache, capacity=128):
+        super().__init__(compositor)
+        self.sprite_cache = sprite_cache
+        self.pool = ParticlePool(capacity)
+        self.bounds = QRect()
 
-class FallingTile(QLabel):
+    def spawn(self, x, y, sprite):
+        """
+        Flies the sprite off in a random direction for ~1 second.
+        """
+        angle = random.uniform(0, 2*math.pi)
+        # 1..3 px per 33 ms tick, as pixels per second
+        speed = random.uniform(1.0, 3.0) * (1000 / 33.0)
+        self.pool.spawn(x, y, speed*math.cos(angle), speed*math.sin(angle), sprite,
+                        time.monotonic(), lifetime=1.0)
+
+    def update_particles(self):
+        live = self.pool.step(time.monotonic())
+        # repaint where particles were and where they are now
+        self.invalidate(self.bounds)
+        self.bounds = QRect()
+        if live:
+            idx = self.pool.live()
+            sizes = self.sprite_cache.sprites
+            max_w = max(sizes[i].width() for i in set(self.pool.sprite[idx].tolist()))
+            max_h = max(sizes[i].height() for i in set(self.pool.sprite[idx].tolist()))
+            x0 = int(self.pool.x[idx].min())
+            y0 = int(self.pool.y[idx].min())
+            x1 = int(self.pool.x[idx].max()) + max_w
+            y1 = int(self.pool.y[idx].max()) + max_h
+            self.bounds = QRect(QPoint(x0, y0), QPoint(x1, y1))
+            self.invalidate(self.bounds)
+
+    def paint(self, painter, dirty):
+        if not self.bounds.intersects(dirty):
+            return
+        idx = self.pool.live()
+        sprites = self.sprite_cache.sprites
+        xs = self.pool.x[idx].astype(np.int32).tolist()
+        ys = self.pool.y[idx].astype(np.int32).tolist()
+        ids = self.pool.sprite[idx].tolist()
+        for x, y, sprite in zip(xs, ys, ids):
+            painter.drawPixmap(x, y, sprites[sprite])
+
+class TileLayer(Layer):
     """
-    A tile that drops near the piano key.
+    Auto-spawned tiles.
     White note => tile is BLUE, Black note => tile is PINK.
-    If Teach OFF => collisions-based scoring (no sound on collision).
+    If Teach OFF => tiles are judged targets (no sound when they land).
+
+    Tile motion lives in a TileEngine and runs on elapsed time; this layer
+    only steps the engine and paints every tile in one pass.
     """
-    def __init__(self, parent, piano, note_name, key_rect, fall_speed, x_offset=0):
-        super().__init__(parent)
+    name = "tiles"
+
+    def __init__(self, compositor, piano):
+        super().__init__(compositor)
         self.piano = piano
-        self.note_name = note_name
-        self.key_rect = key_rect
-        self.fall_speed = fall_speed
-        self.is_finished = False
+        self.engine = TileEngine()
+        # tile notes are key indices of the layout, stable across relayouts
+        self.note_names = piano.key_layout.names
+        self.note_index = piano.key_layout.index
+        self.note_is_black = piano.key_layout.is_black
 
-        tile_side = int(key_rect.width() * 0.7)
-        self.resize(tile_side, tile_side)
+        self.white_brush = QBrush(QColor(0, 128, 255, 180))   # blue
+        self.black_brush = QBrush(QColor(255, 105, 180, 180)) # hotpink-ish
+        self.border_pen = QPen(QColor(0, 0, 0, 220), 3)
 
-        start_x = key_rect.x() + x_offset + (key_rect.width() - tile_side)//2
-        start_y = -tile_side
-        self.move(start_x, start_y)
+        self.tile_rects = []
+        self.fall_speed = 120  # px/s
 
-        # Color the tile based on if note_name is white or black
-        if note_name in piano.blackNoteNames:
-            # pink
-            self.fill_color = QColor(255, 105, 180, 180)  # hotpink-ish
-        else:
-            # blue
-            self.fill_color = QColor(0, 128, 255, 180)
+    def spawnTile(self, note_name, fall_speed=None, spawn_time=None, tag=-1):
+        """
+        fall_speed is in pixels per second. spawn_time (monotonic) lets the
+        scheduler release a tile at its exact ideal time even if the tick
+        that spawns it runs a little early or late.
+        """
+        note = self.note_index.get(note_name)
+        if note is None:
+            return
+        key_rect = self.piano.keys_info[note][0]
+        fall_speed = fall_speed or self.fall_speed
+        spawn_time = time.monotonic() if spawn_time is None else spawn_time
 
-        self.border_color = QColor(0, 0, 0, 220)
-        self.border_width = 3
+        x_offset = self.engine.active_count(note) * 20
+        tile_side = int(key_rect.width() * 0.7)
+        start_x = key_rect.x() + x_offset + (key_rect.width() - tile_side)//2
+        i = self.engine.spawn(note, start_x, tile_side, key_rect.y(), fall_speed, spawn_time, tag=tag)
+        if self.piano.auto_play_muted:
+            self.piano.judge.add_target(note_name, self.engine.arrival_time(i))
 
-        # margin for "close"
-        self.margin_close = 50
-        self.show()
+    def fall_time(self, note_name):
+        """
+        Seconds from spawn (just above the screen) until the tile touches its key.
+        """
+        note = self.note_index.get(note_name)
+        if note is None:
+            return 0.0
+        return self.piano.keys_info[note][0].y() / float(self.fall_speed)
 
-    def paintEvent(self, event):
-        super().paintEvent(event)
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
+    def relayout(self, old_x, old_w):
+        """
+        Keeps every live tile over its key after the keys moved or resized.
+        """
+        e = self.engine
+        n = e.count
+        if n:
+            layout = self.piano.key_layout
+            note = e.note[:n]
+            scale = layout.w[note] / np.maximum(old_w[note], 1).astype(np.float32)
+            e.x[:n] = layout.x[note] + (e.x[:n] - old_x[note]) * scale
+            e.size[:n] *= scale
+            e.key_top[:n] = layout.y[note]
+        self.invalidate()
+        self.update_rects()
 
-        pen = QPen(self.border_color, self.border_width)
-        painter.setPen(pen)
-        painter.setBrush(self.fill_color)
-        painter.drawRect(self.rect())
+    def update_tiles(self):
+        now = time.monotonic()
+        hits = self.engine.step(now)
 
-    def update_position(self):
-        if self.is_finished:
-            return
+        # timing quality: how far past its beat each scheduled tile was seen
+        for i in hits:
+            if self.engine.tag[i] >= 0:
+                err_ms = (now - self.engine.arrival_time(i)) * 1000
+                self.piano.scheduler.record_arrival(int(self.engine.tag[i]), err_ms)
 
-        nx = self.x()
-        ny = self.y() + self.fall_speed
-        self.move(nx, ny)
+        # If Teach=ON => tiles reaching the key produce sound
+        if not self.piano.auto_play_muted:
+            for i in hits:
+                self.piano.trigger_note_by_name(self.note_names[self.engine.note[i]], from_tile=True)
 
-        tile_bottom = ny + self.height()
-        key_top = self.key_rect.y()
+        self.engine.compact()
+        self.update_rects()
 
-        # Collisions-based scoring if Teach OFF
-        if self.piano.auto_play_muted:
-            # Modified to handle list of collisions
-            if not any(c['note_name'] == self.note_name for c in self.piano.collisions):
-                if tile_bottom >= key_top - self.margin_close:
-                    now_ms = int(time.time() * 1000)
-                    self.piano.collisions.append({'note_name': self.note_name, 'ctime': now_ms})
-
-        # If tile hits the key
-        if tile_bottom >= key_top:
-            # If Teach=ON => produce sound
-            if not self.piano.auto_play_muted:
-                self.piano.trigger_note_by_name(self.note_name, from_tile=True)
-            self.is_finished = True
-
-class TileOverlay(QLabel):
+    def update_rects(self):
+        """
+        Rebuilds the tile rects and invalidates old + new positions.
+        """
+        for (r, _) in self.tile_rects:
+            self.invalidate(r.adjusted(-2, -2, 2, 2))
+        e = self.engine
+        idx = e.visible()
+        xs = e.x[idx].astype(np.int32).tolist()
+        ys = e.y[idx].astype(np.int32).tolist()
+        sizes = e.size[idx].astype(np.int32).tolist()
+        black = self.note_is_black[e.note[idx]].tolist()
+        self.tile_rects = [(QRect(x, y, sz, sz), is_black)
+                           for x, y, sz, is_black in zip(xs, ys, sizes, black)]
+        for (r, _) in self.tile_rects:
+            # border pen is 3px wide, half of it sits outside the rect
+            self.invalidate(r.adjusted(-2, -2, 2, 2))
+
+    def paint(self, painter, dirty):
+        white_rects = []
+        black_rects = []
+        for (r, is_black) in self.tile_rects:
+            if r.intersects(dirty.adjusted(-2, -2, 2, 2)):
+                (black_rects if is_black else white_rects).append(r)
+        if not white_rects and not black_rects:
+            return
+
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(self.border_pen)
+        if white_rects:
+            painter.setBrush(self.white_brush)
+            painter.drawRects(white_rects)
+        if black_rects:
+            painter.setBrush(self.black_brush)
+            painter.drawRects(black_rects)
+
+class KeyboardLayer(Layer):
     """
-    Overlay for auto-spawned tiles.
+    Paints all piano keys itself instead of one styled QPushButton per key.
+    Brushes are built once; set_pressed() only repaints the keys that changed.
     """
-    def __init__(self, parent, width, height, piano):
-        super().__init__(parent)
-        self.setGeometry(0, 0, width, height)
-        self.setStyleSheet("background: transparent;")
-        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+    name = "keyboard"
 
-        self.piano = piano
-        self.tiles = []
-
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.update_tiles)
-        self.update_timer.start(33)
-
-    def spawnTile(self, note_name, fall_speed=4):
-        active_count = sum(1 for t in self.tiles if t.note_name == note_name and not t.is_finished)
-        x_offset = active_count * 20
-
-        key_rect = None
-        for (btn, nm) in self.piano.keys_info:
-            if nm == note_name:
-                key_rect = btn.geometry()
-                break
-        if not key_rect:
-            return
-
-        tile = FallingTile(self, self.piano, note_name, key_rect, fall_speed, x_offset)
-        self.tiles.append(tile)
+    def __init__(self, compositor, keys, black_names, on_click):
+        """
+        keys: list of (QRect in window coords, note_name).
+        on_click: called with the note name of a clicked key.
+        """
+        super().__init__(compositor)
+        self.on_click = on_click
+        self.black_names = black_names
+        self.set_keys(keys)
 
-    def update_tiles(self):
-        for t in self.tiles[:]:
-            t.update_position()
-            if t.is_finished:
-                self.tiles.remove(t)
-                t.deleteLater()
+        self.pressed = set()
+        self.show_notes = False
+        self.painted_keys = 0
+
+        self.white_brush = QBrush(QColor(255, 255, 255, 220))
+        self.black_brush = QBrush(QColor(0, 0, 0, 220))
+        self.pressed_brush = QBrush(QColor("yellow"))
+        self.border_pen = QPen(QColor("black"), 1)
+        self.pressed_pen = QPen(QColor("black"), 2)
+        self.white_font = QFont()
+        self.white_font.setBold(True)
+        self.white_font.setPixelSize(24)
+        self.black_font = QFont(self.white_font)
+        self.black_font.setPixelSize(20)
+
+    def set_keys(self, keys):
+        """
+        New key rects, e.g. after a relayout. Only keys on screen are kept.
+        """
+        if getattr(self, "bounds", None) is not None:
+            self.invalidate(self.bounds)
+        screen = self.compositor.rect()
+        # white keys first so black keys paint on top
+        self.white_keys = []
+        self.black_keys = []
+        self.bounds = QRect()
+        for (r, nm) in keys:
+            if not screen.intersects(r):
+                continue
+            self.bounds = self.bounds.united(r)
+            if nm in self.black_names:
+                self.black_keys.append((r, nm))
+            else:
+                self.white_keys.append((r, nm))
+        self.rects = dict((nm, r) for (r, nm) in keys)
+        self.index = None
+        self.invalidate(self.bounds)
+
+    def set_pressed(self, names, down):
+        for nm in names:
+            if down == (nm in self.pressed):
+                continue
+            if down:
+                self.pressed.add(nm)
+            else:
+                self.pressed.discard(nm)
+            # pen is 2px when pressed => include the border
+            self.invalidate(self.rects[nm].adjusted(-1, -1, 1, 1))
+
+    def set_show_notes(self, show):
+        if show != self.show_notes:
+            self.show_notes = show
+            self.invalidate(self.bounds)
+
+    def take_painted_count(self):
+        n = self.painted_keys
+        self.painted_keys = 0
+        return n
+
+    def paint(self, painter, dirty):
+        if not self.bounds.intersects(dirty):
+            return
+        for keys, brush, font, text_color in (
+            (self.white_keys, self.white_brush, self.white_font, Qt.black),
+            (self.black_keys, self.black_brush, self.black_font, Qt.white),
+        ):
+            painter.setFont(font)
+            for (r, nm) in keys:
+                if not r.intersects(dirty):
+                    continue
+                self.painted_keys += 1
+                if nm in self.pressed:
+                    painter.setPen(self.pressed_pen)
+                    painter.setBrush(self.pressed_brush)
+                else:
+                    painter.setPen(self.border_pen)
+                    painter.setBrush(brush)
+                painter.drawRect(r.adjusted(0, 0, -1, -1))
+                if self.show_notes:
+                    painter.setPen(Qt.black if nm in self.pressed else text_color)
+                    painter.drawText(r, Qt.AlignCenter, nm.upper())
+
+    def mouse_press(self, pos):
+        if not self.bounds.contains(pos):
+            return False
+        if self.index is None:
+            keys = [(nm, (r.x(), r.y(), r.width(), r.height()), nm in self.black_names)
+                    for (r, nm) in self.white_keys + self.black_keys]
+            self.index = KeyHitIndex(keys, self.bounds.right() + 1)
+        hit = self.index.query(np.array([[pos.x(), pos.y()]]))[0]
+        if hit < 0:
+            return False
+        self.on_click(self.index.names[hit])
+        return True
 
 class ARPiano(QMainWindow):
     """
     AR Piano with:
-     - Teach Toggle => collisions-based or auto-play
+     - Teach Toggle => judged scoring or auto-play
      - Real-time tempo slider (green->orange->red)
      - White note => tile is blue, black => tile is pink
      - Pressed key => highlight in yellow, revert to original color on release
      - Show Notes starts OFF, Teach starts ON, Tempo starts at 1.25
     """
 
-    # We'll define the note sets for quick reference
-    whiteNoteNames = {
-        "c4","d4","e4","f4","g4","a4","b4",
-        "c5","d5","e5","f5","g5","a5","b5"
-    }
-    blackNoteNames = {
-        "c40","d40","f40","g40","a40","c50","d50","f50","g50","a50"
-    }
-
     FINGER_TIPS = [8,12,16,20]
     FINGER_PIPS = [6,10,14,18]
-
-    def __init__(self):
+    # stage order on the performance HUD
+    HUD_STAGES = ("hands", "judge", "frame", "tiles", "effects", "status",
+                  "paint:camera", "paint:keyboard", "paint:tiles", "paint:skeleton", "paint:effects",
+                  "tempo_style", "capture", "inference", "hands.process")
+
+    # decoded note sprite pixels from the loader thread, queued to the GUI thread
+    spritesDecoded = pyqtSignal(object)
+
+    def __init__(self, inference_process=False, inference_mode="full", inference_size=640,
+                 preview_filter="smooth", measure_alloc=False, audio_buffer=512, audio_voices=24,
+                 input_latency=0.0, record_landmarks=None, replay_landmarks=None,
+                 replay_speed=1.0, replay_exit=False, hud=False, trace_path=None,
+                 hand_filter="one-euro", max_predict_ms=80, governor=True, target_fps=30,
+                 quality_min=0, quality_max=len(QUALITY_LEVELS) - 1, motion_gate=True,
+                 startup=None, profile_startup=False, key_range="c4-b5", min_key_w=40,
+                 player="player1", leaderboard_path=None, record_session=None):
         super().__init__()
         self.setWindowTitle("AR Piano Teaching Machine")
+        # nothing slow runs here: camera, mixer, sounds and the hand model
+        # come up on background threads while the window is already showing
+        self.startup = startup or StartupProfile()
+        self.profile_startup = profile_startup
+        self.assets = AssetLoader()
 
-        pygame.init()
-        pygame.mixer.init()
-
-        # *** MODIFICATION START ***
-        # Initialize collisions as a list to handle multiple simultaneous collisions
-        self.collisions = []  # List of dicts with 'note_name' and 'ctime'
-        # *** MODIFICATION END ***
+        # small mixer buffer, the AudioEngine thread keeps one block queued
+        self.audio = AudioEngine(sample_rate=44100, block_size=audio_buffer, max_voices=audio_voices)
 
-        self.tile_score_window_ms = 500
+        # Teach OFF scoring: every tile is a target at the time it reaches its key
+        self.judge = JudgementEngine(latency_ms=input_latency)
 
         # tempo factor start at 1.25 => medium
         self.tempoFactor = 1.25
-
-        # We'll keep original style references for each key
-        self.keyStyles = {}
+        self.scheduler = MelodyScheduler()
+        self.song_library = SongLibrary(os.path.join(os.path.dirname(os.path.abspath(__file__)), "songs"))
 
         screen = QGuiApplication.primaryScreen()
         rect = screen.availableGeometry()
@@ -251,56 +593,111 @@ class ARPiano(QMainWindow):
         self.screen_h = rect.height()
         self.setGeometry(0,0,self.screen_w,self.screen_h)
 
-        self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if not self.cap.isOpened():
-            print("Warning: Could not open camera.")
-        else:
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH,self.screen_w)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT,self.screen_h)
+        # a replay needs neither the camera nor MediaPipe
+        self.replaying = replay_landmarks is not None
+        self.replay_exit = replay_exit
+        self.replay_done = False
+
+        # per-stage timings for the HUD / trace file, free while both are off
+        self.profiler = StageProfiler(trace_path)
 
-        self.camera_label = QLabel(self)
-        self.camera_label.setGeometry(0,0,self.screen_w,self.screen_h)
-        self.camera_label.setStyleSheet("background-color:black;")
+        # one surface for camera, keys, tiles, skeleton and flying notes
+        self.compositor = Compositor(self,self.screen_w,self.screen_h)
+        self.compositor.profiler = self.profiler
+        self.camera_layer = self.compositor.add_layer(
+            CameraLayer(self.compositor, smooth=(preview_filter == "smooth"))
+        )
 
-        self.keys_info = []
+        # key names, colours, shortcuts and geometry for the chosen range
+        self.key_layout = KeyboardLayout(*parse_key_range(key_range), min_key_w=min_key_w)
+        self.whiteNoteNames = {nm for nm, b in zip(self.key_layout.names, self.key_layout.is_black) if not b}
+        self.blackNoteNames = {nm for nm, b in zip(self.key_layout.names, self.key_layout.is_black) if b}
+        self.keys_info = []  # (QRect, note_name), in key_layout order
+        self.keyShortcuts = self.key_layout.shortcuts
+        self.hit_index = None
+        self.sample_bank = None
         self.load_sounds()
         self.load_note_images()
 
         # Create keys
-        self.create_white_keys()
-        self.create_black_keys()
+        with self.startup.phase("keyboard"):
+            self.key_layout.fit(self.screen_w, self.screen_h)
+            self.create_keys()
+            self.create_keyboard_layer()
 
         self.setStatusBar(QStatusBar(self))
 
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=2,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        self.HAND_CONNECTIONS = self.mp_hands.HAND_CONNECTIONS
-
-        self.is_held = {}
-        for (_, nm) in self.keys_info:
-            self.is_held[nm] = False
-
-        # overlays
-        self.skeleton_overlay = SkeletonOverlay(self,self.screen_w,self.screen_h)
-        self.skeleton_overlay.show()
-
-        self.effects_overlay = EffectOverlay(self,self.screen_w,self.screen_h)
-        self.effects_overlay.raise_()
-        self.effects_overlay.show()
-
-        self.tile_overlay = TileOverlay(self,self.screen_w,self.screen_h,piano=self)
-        self.tile_overlay.raise_()
-        self.tile_overlay.show()
-
-        # camera update
+        # in process mode the hand graph lives in the worker process only
+        self.inference_process = inference_process
+        self.hands = None
+        # complexity of self.hands, and the one the governor last asked for;
+        # graphs are only ever built on a hands-build thread, one at a time
+        self.model_complexity = HANDS_OPTIONS.get("model_complexity", 1)
+        self.wanted_complexity = self.model_complexity
+        self.hands_lock = threading.Lock()
+        self.hands_building = False
+        self.HAND_CONNECTIONS = HAND_CONNECTIONS
+
+        # landmark smoothing + extrapolation over the capture->now latency
+        self.hand_filter = OneEuroLandmarks() if hand_filter == "one-euro" else None
+        self.max_predict = max_predict_ms / 1000.0
+        self.predict_lead_ms = 0.0
+
+        # per-finger strikes => note on/off with velocity; is_held stays the same dict
+        self.press_detector = PressDetector([nm for (_, nm) in self.keys_info],
+                                            MAX_HANDS * len(self.FINGER_TIPS))
+        self.is_held = self.press_detector.held
+        self.keys_painted = 0
+
+        # layers above the keyboard, bottom to top
+        self.tile_layer = self.compositor.add_layer(TileLayer(self.compositor, piano=self))
+        self.skeleton_layer = self.compositor.add_layer(SkeletonLayer(self.compositor))
+        self.effects_layer = self.compositor.add_layer(EffectLayer(self.compositor, self.noteSprites))
+
+        # capture + inference run off the GUI thread, GUI only drains results
+        tracker_options = dict(mode=inference_mode, max_side=inference_size)
+        gate_options = dict(region=self.motion_region()) if motion_gate else None
+        if self.replaying:
+            self.pipeline = ReplayPipeline(LandmarkRecording(replay_landmarks), speed=replay_speed)
+            self.pipeline.start()
+        else:
+            if inference_process:
+                backend = ProcessBackend(HANDS_OPTIONS, tracker_options=tracker_options,
+                                         gate_options=gate_options)
+            else:
+                # the graph is built by warm_up_hands() and handed over when ready
+                backend = ThreadBackend(None, tracker_options=tracker_options,
+                                        gate_options=gate_options)
+                self.hands_building = True
+                threading.Thread(target=self.warm_up_hands, args=(backend,),
+                                 name="hands-warmup", daemon=True).start()
+            self.pipeline = FramePipeline(self.open_camera, backend)
+            self.pipeline.start()
+        self.pipeline.set_profiler(self.profiler)
+
+        # trades inference size, model, frame skip, preview filter and
+        # particles for frame rate; quality_min/max bound the levels it may use
+        self.preview_smooth = preview_filter == "smooth"
+        if clamp_target_fps(target_fps) != target_fps:
+            print(f"Warning: --target-fps {target_fps:g} is out of range, using {clamp_target_fps(target_fps):g}")
+            target_fps = clamp_target_fps(target_fps)
+        self.target_fps = target_fps
+        self.governor = None
+        if governor:
+            self.governor = QualityGovernor(target_fps, quality_min, quality_max)
+            self.apply_quality(self.governor.settings())
+        self.landmark_recorder = LandmarkRecorder(record_landmarks) if record_landmarks else None
+        # every note that sounds, to a MIDI file + event log, written off-thread
+        self.session_recorder = SessionRecorder(record_session) if record_session else None
+        self.ui_frames = 0
+        self.last_stats_time = time.monotonic()
+        self.alloc_meter = AllocMeter() if measure_alloc else None
+
+        # camera update, paced by target_fps so the governor's budget is reachable
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.update_camera)
-        self.timer.start(30)
+        self.timer.start(tick_interval_ms(target_fps))
 
         # toggles
         self.auto_play_muted = False  # Teach ON => normal auto-play
@@ -309,129 +706,230 @@ class ARPiano(QMainWindow):
         self.show_notes = False  # start with no note labels
         self.createShowNotesToggleButton()
 
+        # a judged (Teach OFF) song that runs to the end becomes a leaderboard
+        # row; saving happens on the leaderboard's own thread
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.player = player
+        self.leaderboard = Leaderboard(leaderboard_path or os.path.join(here, "leaderboard.db"))
+        self.leaderboard.import_csv(os.path.join(here, "leaderboard.csv"))
+        self.current_song = None  # (title, score at start, judge counts at start)
+
         # scoring
         self.score = 0
         self.scoreLabel = QLabel("Score: 0", self)
         self.scoreLabel.setStyleSheet("color:white;font-size:20px;")
         self.scoreLabel.setGeometry(20,10,200,40)
+        # last finished song vs. the leaderboard
+        self.resultLabel = QLabel("", self)
+        self.resultLabel.setStyleSheet("color:white;font-size:16px;")
+        self.resultLabel.setGeometry(20,50,900,30)
         self.scoreLabel.show()
 
+        # performance HUD, F3 toggles
+        self.hudLabel = QLabel("", self)
+        self.hudLabel.setStyleSheet("color:white;font-size:13px;background-color:rgba(0,0,0,140);")
+        self.hudLabel.setGeometry(230,10,self.screen_w-250,40)
+        self.hudLabel.setVisible(hud)
+        self.profiler.set_hud(hud)
+        self.last_hud_time = 0.0
+        self.hudShortcut = QShortcut(QKeySequence("F3"), self)
+        self.hudShortcut.activated.connect(self.toggleHud)
+
         # tempo slider
         self.createTempoSlider()
 
         # music selection
         self.createMusicSelection()
 
+    def open_camera(self):
+        """
+        Runs on the capture thread: DirectShow can take a second to open.
+        """
+        import cv2
+
+        with self.startup.phase("camera open"):
+            cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+            if cap.isOpened():
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH,self.screen_w)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT,self.screen_h)
+        return cap
+
+    def warm_up_hands(self, backend):
+        """
+        Imports mediapipe and builds the hand graph off the GUI thread.
+        """
+        with self.startup.phase("hand model"):
+            import mediapipe as mp
+            hands = mp.solutions.hands.Hands(**HANDS_OPTIONS)
+        with self.hands_lock:
+            self.hands = hands
+        backend.worker.replace_hands(hands)
+        # the governor may have changed the model while this was building
+        self.rebuild_hands(backend)
+
+    def rebuild_hands(self, backend):
+        """
+        Builds graphs until one matches wanted_complexity, then clears
+        hands_building. Runs on a background thread: a graph takes hundreds
+        of ms to build, the worker swaps it in between two frames.
+        """
+        import mediapipe as mp
+
+        while True:
+            with self.hands_lock:
+                complexity = self.wanted_complexity
+                if complexity == self.model_complexity:
+                    self.hands_building = False
+                    return
+            hands = mp.solutions.hands.Hands(**dict(HANDS_OPTIONS, model_complexity=complexity))
+            with self.hands_lock:
+                self.hands = hands
+                self.model_complexity = complexity
+            backend.worker.replace_hands(hands)
+
     def load_sounds(self):
-        base = "C:/Users/LLR User/Desktop/music/Sounds/"
-        white_notes = [
-            "c4","d4","e4","f4","g4","a4","b4",
-            "c5","d5","e5","f5","g5","a5","b5"
-        ]
-        black_notes = [
-            "c40","d40","f40","g40","a40",
-            "c50","d50","f50","g50","a50"
-        ]
-        self.sounds = {}
-        for note in white_notes + black_notes:
+        """
+        Maps the sample bank (every piano key, missing recordings
+        pitch-shifted from the nearest one) on a loader thread; notes play
+        straight from the mapped pages. The mixer opens on the audio thread
+        meanwhile.
+        """
+        threading.Thread(target=self.load_sample_bank, name="sounds", daemon=True).start()
+        self.audio_output = AudioOutput(self.audio, init_mixer=True)
+        self.audio_started = time.perf_counter()
+        self.audio_output.start()
+
+    def load_sample_bank(self):
+        rate = self.audio.sample_rate
+
+        def decode(paths):
+            # only when the bank has to be (re)built: recordings decode side by side,
+            # uncached, the bank itself is the cache
+            futures = [self.assets.submit_sample(p, rate) for p in paths]
+            return [f.result() for f in futures]
+
+        with self.startup.phase("sounds"):
             try:
-                self.sounds[note] = pygame.mixer.Sound(base + f"{note}.wav")
-            except pygame.error:
-                print(f"Could not load sound: {note}.wav")
+                self.sample_bank = SampleBank.load_or_build(
+                    SOUNDS_DIR, os.path.join(CACHE_DIR, f"samples-{rate}.bank"), rate, decode=decode)
+            except (OSError, EOFError, wave.Error, ValueError) as e:
+                print(f"Warning: Could not load sounds: {e}")
+                return
+            for nm in self.sample_bank.names():
+                self.audio.add_sample(nm, self.sample_bank.sample(nm))
 
     def load_note_images(self):
-        self.notePixmaps = []
-        for i in range(1,6):
-            path = f"Assets/note{i}.png"
-            pix = QPixmap(path)
-            if not pix.isNull():
-                self.notePixmaps.append(pix)
-            else:
-                print(f"Warning: Could not load {path}")
-
-    def create_white_keys(self):
-        white_keys = [
-            ("c4","Q"), ("d4","W"), ("e4","E"), ("f4","R"),
-            ("g4","T"), ("a4","Y"), ("b4","U"),
-            ("c5","I"), ("d5","O"), ("e5","P"), ("f5","["),
-            ("g5","]"), ("a5","\\"), ("b5","1")
-        ]
-        num_white = len(white_keys)
-        key_w = self.screen_w/15.0
-        key_h = self.screen_h/3.0
-        total_w = num_white*key_w
-        x_start = (self.screen_w - total_w)/2
-
-        self.piano_x_start = x_start
-        self.piano_total_w = total_w
-
-        margin_bottom = self.screen_h*0.20
-        y_pos = self.screen_h - key_h - margin_bottom
-
-        base_white_style = """
-            background-color: rgba(255, 255, 255, 220);
-            border: 1px solid black;
-            font-weight: bold;
-            font-size: 24px;
-        """
-        for i, (note_name, shortcut) in enumerate(white_keys):
-            x = x_start + i*key_w
-            btn = QPushButton(note_name.upper(), self)
-            btn.setObjectName(note_name)
-            btn.setShortcut(shortcut)
-            btn.setGeometry(QRect(int(x), int(y_pos), int(key_w), int(key_h)))
-            btn.setStyleSheet(base_white_style)
-            btn.clicked.connect(self.play_sound)
-            self.keys_info.append((btn, note_name))
-
-            # store original style
-            self.keyStyles[note_name] = base_white_style
-
-    def create_black_keys(self):
-        black_keys = [
-            ("c40","2"), ("d40","3"), ("f40","5"), ("g40","6"), ("a40","7"),
-            ("c50","8"), ("d50","9"), ("f50","0"), ("g50","-"), ("a50","=")
-        ]
-        white_key_w = self.screen_w/15.0
-        black_key_w = white_key_w*0.5
-        black_key_h = self.screen_h/4.5
-
-        num_white = 14
-        total_white_w = num_white*white_key_w
-        x_white_start = (self.screen_w - total_white_w)/2
-        margin_bottom = self.screen_h*0.20
-        y_white_pos = self.screen_h - (self.screen_h / 3.0) - margin_bottom
-
-        base_black_style = """
-            background-color: rgba(0, 0, 0, 220);
-            border: 1px solid black;
-            color: white;
-            font-weight: bold;
-            font-size: 20px;
-        """
-        offsets = [
-            white_key_w*0.7,  white_key_w*1.7,  white_key_w*3.7,
-            white_key_w*4.7,  white_key_w*5.7,  white_key_w*7.7,
-            white_key_w*8.7,  white_key_w*10.7, white_key_w*11.7,
-            white_key_w*12.7,
-        ]
-        for i, (note_name, shortcut) in enumerate(black_keys):
-            x = x_white_start + offsets[i]
-            btn = QPushButton(note_name.upper(), self)
-            btn.setObjectName(note_name)
-            btn.setShortcut(shortcut)
-            btn.setGeometry(QRect(int(x), int(y_white_pos), int(black_key_w), int(black_key_h)))
-            btn.setStyleSheet(base_black_style)
-            btn.clicked.connect(self.play_sound)
-            self.keys_info.append((btn, note_name))
-
-            self.keyStyles[note_name] = base_black_style
+        """
+        Starts with no sprites: flying notes appear once the loader thread
+        has decoded them and add_note_sprites() has run on the GUI thread.
+        """
+        self.noteSprites = NoteSpriteCache([])
+        self.spritesDecoded.connect(self.add_note_sprites)
+        threading.Thread(target=self.decode_note_images, name="note-images", daemon=True).start()
+
+    def decode_note_images(self):
+        # every (image, scale) is decoded and scaled on the asset pool;
+        # only the QPixmap conversion is left for the GUI thread
+        with self.startup.phase("note images"):
+            jobs = []
+            for i in range(1,6):
+                path = os.path.join(IMAGES_DIR, f"note{i}.png")
+                for sf in NoteSpriteCache.SCALES:
+                    decode = lambda p, sf=sf: decode_sprite(p, sf)
+                    jobs.append((path, self.assets.submit(path, decode, tag=f"argb{sf}")))
+            pixels = []
+            failed = set()
+            for path, future in jobs:
+                try:
+                    pixels.append(future.result())
+                except (OSError, ValueError):
+                    if path not in failed:
+                        failed.add(path)
+                        print(f"Warning: Could not load {path}")
+        self.spritesDecoded.emit(pixels)
+
+    def add_note_sprites(self, pixels):
+        # the effects layer holds the same cache, so it sees them straight away
+        self.noteSprites.sprites = [pixels_to_pixmap(p) for p in pixels]
+
+    def create_keys(self):
+        """
+        keys_info from the layout's current geometry.
+        """
+        layout = self.key_layout
+        self.keys_info = [(QRect(x, y, w, h), nm) for nm, (x, y, w, h) in layout.rects()]
+        self.piano_x_start = layout.x_start
+        self.piano_total_w = layout.total_w
+
+    def create_keyboard_layer(self):
+        self.keyboard = self.compositor.add_layer(
+            KeyboardLayer(self.compositor, self.keys_info, self.blackNoteNames, self.trigger_note_by_name)
+        )
+        self.shortcuts = []
+        # the note behind a key is looked up when pressed: it moves with the range on screen
+        for key in SHORTCUT_KEYS:
+            sc = QShortcut(QKeySequence(key), self)
+            sc.activated.connect(lambda key=key: self.trigger_shortcut(key))
+            self.shortcuts.append(sc)
+        # an octave at a time when the range is wider than the screen
+        for key, whites in (("Left", -7), ("Right", 7)):
+            sc = QShortcut(QKeySequence(key), self)
+            sc.activated.connect(lambda whites=whites: self.scroll_keys(whites))
+            self.shortcuts.append(sc)
+
+    def trigger_shortcut(self, key):
+        nm = self.key_layout.shortcut_notes.get(key)
+        if nm is not None:
+            self.trigger_note_by_name(nm)
+
+    def scroll_keys(self, whites):
+        old = self.key_layout.x.copy(), self.key_layout.w.copy()
+        if self.key_layout.scroll(whites):
+            self.relayout(*old)
+
+    def relayout(self, old_x, old_w):
+        """
+        Pushes new key geometry to everything that uses it. O(keys) plus
+        the live tiles, and only runs on resize or scroll.
+        """
+        self.create_keys()
+        self.keyboard.set_keys(self.keys_info)
+        self.tile_layer.relayout(old_x, old_w)
+        self.hit_index = None
+        backend = getattr(self.pipeline, "backend", None)
+        if backend is not None:
+            backend.set_gate_region(self.motion_region())
+
+    def key_hit_index(self):
+        """
+        Hit-test index over the current key layout, rebuilt only when the
+        layout or window size changes.
+        """
+        if self.hit_index is None:
+            keys = []
+            for (r, nm) in self.keys_info:
+                keys.append((nm, (r.x(), r.y(), r.width(), r.height()), nm in self.blackNoteNames))
+            self.hit_index = KeyHitIndex(keys, max(self.width(), self.screen_w))
+        return self.hit_index
+
+    def resizeEvent(self, event):
+        self.hit_index = None
+        super().resizeEvent(event)
+        if getattr(self, "pipeline", None) is None:
+            return  # still inside __init__
+        size = event.size()
+        if (size.width(), size.height()) == (self.key_layout.width, self.key_layout.height):
+            return
+        self.compositor.resize(size)
+        old = self.key_layout.x.copy(), self.key_layout.w.copy()
+        self.key_layout.fit(size.width(), size.height())
+        self.relayout(*old)
 
     def createTeachToggleButton(self):
         """
         Teach Toggle:
         Teach ON => auto-play, tile collisions produce sound
-        Teach OFF => collisions => no sound from collisions, user can press keys to produce sound
+        Teach OFF => tiles land silently, user presses keys and is judged on timing
         """
         btn_w, btn_h = 200, 30
         padding_right = 20
@@ -467,11 +965,12 @@ class ARPiano(QMainWindow):
         self.show_notes = False
 
         # Hide note labels on startup
-        for (btn, nm) in self.keys_info:
-            btn.setText("")
+        self.keyboard.set_show_notes(False)
 
     def toggleTeach(self):
         self.auto_play_muted = not self.auto_play_muted
+        self.judge.reset()
+        self.current_song = None  # half judged, half not => not a leaderboard run
         if self.auto_play_muted:
             self.teachButton.setText("Teach You To Play: OFF")
         else:
@@ -483,11 +982,7 @@ class ARPiano(QMainWindow):
             self.showNotesButton.setText("Show Notes: ON")
         else:
             self.showNotesButton.setText("Show Notes: OFF")
-        for (btn, nm) in self.keys_info:
-            if self.show_notes:
-                btn.setText(nm.upper())
-            else:
-                btn.setText("")
+        self.keyboard.set_show_notes(self.show_notes)
 
     def createTempoSlider(self):
         """
@@ -505,7 +1000,9 @@ class ARPiano(QMainWindow):
 
     def onTempoSliderChanged(self, value):
         self.tempoFactor = value / 100.0
-        self.updateTempoSliderStyle(value)
+        self.scheduler.set_tempo(self.tempoFactor)
+        with self.profiler.section("tempo_style"):
+            self.updateTempoSliderStyle(value)
 
     def updateTempoSliderStyle(self, sliderVal):
         frac = (sliderVal - 50)/150.0
@@ -560,7 +1057,9 @@ class ARPiano(QMainWindow):
 
     def createMusicSelection(self):
         self.musicBox = QComboBox(self)
-        self.musicBox.addItems(["Happy Birthday", "Interstellar"])
+        # titles come from file names; a song is only parsed when played
+        for title, path in self.song_library.songs():
+            self.musicBox.addItem(title, path)
         box_w, box_h = 200, 30
         play_btn_w, play_btn_h = 200, 30
         total_width = box_w + 10 + play_btn_w
@@ -578,94 +1077,55 @@ class ARPiano(QMainWindow):
         self.playMusicButton.clicked.connect(self.onPlayMusicClicked)
 
     def onPlayMusicClicked(self):
-        s = self.musicBox.currentText()
-        if "Happy Birthday" in s:
-            melody = [
-                ('g40',0),('g40',800),('a4',800),('g40',800),('c5',800),('b4',1000),
-                ('g40',800),('g40',800),('a4',800),('g40',800),('d5',800),('c5',1000),
-                ('g4',800),('g4',800),('g5',800),('e5',800),('c5',800),('b4',800),('a4',1200),
-                ('f5',800),('f5',800),('e5',800),('c5',800),('d5',800),('c5',1000)
-            ]
-            self.playMelodyIteratively(melody)
-        elif "Interstellar" in s:
-            melody = [
-                ('a4', 800), ('e5', 800), ('a4', 800), ('e5', 800),
-                ('b4', 800), ('e5', 800), ('b4', 800), ('e5', 800),
-
-                ('c5', 800), ('e5', 800), ('c5', 800), ('e5', 800),
-                ('d5', 800), ('e5', 800), ('d5', 800), ('e5', 800),
-
-                ('a4', 800), ('e5', 800), ('a4', 800), ('e5', 800),
-                ('b4', 800), ('e5', 800), ('b4', 800), ('e5', 800),
-
-                ('c5', 800), ('e5', 800), ('c5', 800), ('e5', 800),
-                ('d5', 800), ('e5', 800), ('d5', 800), ('e5', 800),
-            ]
-
-            self.playMelodyIteratively(melody)
-
+        path = self.musicBox.currentData()
+        if not path:
+            return
+        try:
+            timeline = self.song_library.load(path)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"Warning: could not load song {path}: {e}")
+            return
+        self.playMelodyIteratively(timeline)
+        if self.auto_play_muted:
+            self.current_song = (timeline.title, self.score, dict(self.judge.counts))
 
     def playMelodyIteratively(self, melody):
         """
-        Iterative scheduling => real-time tempo changes affect next note.
+        Hands the melody (a song Timeline or [(note, delta_ms)]) to the
+        scheduler; update_camera releases the tiles.
+        Real-time tempo changes still affect every note not yet released.
         """
-        self.currentMelody = melody
-        self.currentMelodyIndex = 0
-        self.scheduleNextNote()
+        self.scheduler.start(melody, self.tempoFactor, self.tile_layer.fall_time)
+        self.spawn_due_tiles()
 
-    def scheduleNextNote(self):
-        if self.currentMelodyIndex >= len(self.currentMelody):
+    def spawn_due_tiles(self):
+        if not self.scheduler.is_running():
             return
-        note_name, delta = self.currentMelody[self.currentMelodyIndex]
-        self.currentMelodyIndex += 1
-
-        # spawn tile for this note
-        self.tile_overlay.spawnTile(note_name, 4)
-
-        if self.currentMelodyIndex < len(self.currentMelody):
-            next_delta = self.currentMelody[self.currentMelodyIndex][1]
-            QTimer.singleShot(int(next_delta / self.tempoFactor), self.scheduleNextNote)
-
-    def play_sound(self):
-        note_name = self.sender().objectName()
-        self.trigger_note_by_name(note_name)
+        for ev in self.scheduler.due(self.tile_layer.fall_time):
+            # spawned at its ideal time, so tick jitter never shifts the beat
+            self.tile_layer.spawnTile(ev.note, spawn_time=ev.spawn, tag=ev.index)
 
-    def trigger_note_by_name(self, note_name, from_tile=False):
+    def trigger_note_by_name(self, note_name, from_tile=False, at=None, velocity=1.0):
         """
         Handles playing sounds and scoring logic based on teach mode.
+        at: monotonic time of the press (camera frame time for hand presses).
+        velocity: 0..1 strike strength, sets the note's volume.
         """
 
-        current_ms = int(time.time() * 1000)
-
         # 1) If the note is triggered by a falling tile and Teach is ON
         if from_tile and not self.auto_play_muted:
-            if note_name in self.sounds:
-                self.sounds[note_name].play()
+            self.audio.note_on(note_name)
+            self.record_note(note_name, 1.0, from_tile, at)
             return
 
         # 2) If the user presses a key and Teach is OFF (manual scoring)
         if not from_tile and self.auto_play_muted:
             # Always play the sound when pressing a key
-            if note_name in self.sounds:
-                self.sounds[note_name].play()
+            self.audio.note_on(note_name, velocity)
+            self.record_note(note_name, velocity, from_tile, at)
 
-            if not self.collisions:
-                # No notes in proximity, penalize
-                self.addScore(-5)
-            else:
-                matched_collision = None
-                for collision in self.collisions:
-                    if collision['note_name'] == note_name:
-                        if current_ms - collision['ctime'] <= self.tile_score_window_ms:
-                            matched_collision = collision
-                            break
-
-                if matched_collision:
-                    self.addScore(10)
-                    self.collisions.remove(matched_collision)
-                else:
-                    # Wrong key pressed while a note is in proximity
-                    self.addScore(-5)
+            # perfect/good/miss against this note's next tile, stray if none is near
+            self.addScore(POINTS[self.judge.press(note_name, at)])
 
             # Always spawn a flying note for visual feedback
             self.spawnFlyingNoteOnKey(note_name)
@@ -673,17 +1133,30 @@ class ARPiano(QMainWindow):
 
         # 3) If the user presses a key and Teach is ON
         if not from_tile and not self.auto_play_muted:
-            if note_name in self.sounds:
-                self.sounds[note_name].play()
+            self.audio.note_on(note_name, velocity)
+            self.record_note(note_name, velocity, from_tile, at)
             self.spawnFlyingNoteOnKey(note_name)
             return
 
+    def record_note(self, note_name, velocity, from_tile, at):
+        """
+        Hand presses are held until process_hands releases them; tiles,
+        shortcuts and clicks have no release, so they go in as taps.
+        """
+        rec = self.session_recorder
+        if rec is None:
+            return
+        if from_tile:
+            rec.tap(note_name, velocity, SOURCE_TILE)
+        elif at is not None:
+            rec.note_on(note_name, velocity, SOURCE_HAND, at)
+        else:
+            rec.tap(note_name, velocity, SOURCE_KEY)
+
     def spawnFlyingNoteOnKey(self, note_name):
-        # find button
-        for (btn, nm) in self.keys_info:
-            if nm == note_name:
-                self.spawnFlyingNote(btn)
-                break
+        i = self.key_layout.index.get(note_name)
+        if i is not None:
+            self.spawnFlyingNote(self.keys_info[i][0])
 
     def addScore(self, points):
         self.score += points
@@ -691,16 +1164,14 @@ class ARPiano(QMainWindow):
             self.score = 0
         self.scoreLabel.setText(f"Score: {self.score}")
 
-    def spawnFlyingNote(self, btn):
-        if not self.notePixmaps:
+    def spawnFlyingNote(self, r):
+        if not len(self.noteSprites):
             return
-        pix_original = random.choice(self.notePixmaps)
-        sf = random.uniform(0.5,1.2)
-        sw = int(pix_original.width()*sf)
-        sh = int(pix_original.height()*sf)
-        pix_scaled = pix_original.scaled(sw, sh, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        sprite = self.noteSprites.random_sprite()
+        pix = self.noteSprites.sprites[sprite]
+        sw = pix.width()
+        sh = pix.height()
 
-        r = btn.geometry()
         cx = r.x() + r.width()//2
         cy = r.y() + r.height()//2
         offx = random.randint(-r.width()//2, r.width()//2)
@@ -708,106 +1179,367 @@ class ARPiano(QMainWindow):
         sx = cx+offx - sw//2
         sy = cy+offy - sh//2
 
-        note_label = FlyingNote(self.effects_overlay, pix_scaled, sx, sy)
-        self.effects_overlay.raise_()
+        self.effects_layer.spawn(sx, sy, sprite)
 
     def update_camera(self):
-        # Capture
-        ret, frame = self.cap.read()
-        if not ret:
-            return
+        """
+        GUI tick: never waits on the camera or MediaPipe, just takes whatever
+        the pipeline has ready, then steps tiles and flying notes once.
+        """
+        if self.alloc_meter is not None:
+            # everything allocated since the previous tick, paint included
+            self.alloc_meter.tick()
+        if self.startup.first_frame is None and self.replaying:
+            self.startup.first_frame = time.perf_counter()
+            self.report_startup()
+        prof = self.profiler
+        prof.frame_begin()
+
+        if self.governor is not None:
+            infer_ms = self.pipeline.stats().get("inference", {}).get("last_ms")
+            if self.governor.tick(inference_ms=infer_ms) is not None:
+                self.apply_quality(self.governor.settings())
+
+        result = self.pipeline.drain()
+        if result is not None:
+            if self.landmark_recorder is not None:
+                self.landmark_recorder.write(result)
+            self.process_hands(result)
+        elif self.replaying and not self.replay_done and self.pipeline.finished():
+            self.on_replay_finished()
+        prof.mark("hands")
 
-        frame = cv2.flip(frame,1)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h,w,_ = frame_rgb.shape
+        # Handle missed notes
+        missed = self.judge.expire()
+        if missed:
+            self.addScore(POINTS[MISS] * missed)
+        prof.mark("judge")
+
+        frame = self.pipeline.latest_frame()
+        if frame is not None:
+            self.show_frame(frame)
+            if self.startup.first_frame is None:
+                self.startup.first_frame = time.perf_counter()
+                self.report_startup()
+        prof.mark("frame")
+
+        self.spawn_due_tiles()
+        self.tile_layer.update_tiles()
+        if self.current_song is not None:
+            self.check_song_finished()
+        prof.mark("tiles")
+        self.effects_layer.update_particles()
+        prof.mark("effects")
+
+        self.ui_frames += 1
+        self.keys_painted += self.keyboard.take_painted_count()
+        now = time.monotonic()
+        if now - self.last_stats_time >= 1.0:
+            ui_fps = self.ui_frames / (now - self.last_stats_time)
+            keys_per_frame = self.keys_painted / self.ui_frames
+            fx = self.effects_layer.pool.stats()
+            paints, dirty_frac = self.compositor.take_paint_stats()
+            timing = self.scheduler.report()
+            judged = self.judge.stats()
+            calib = self.judge.suggested_latency_ms()
+            self.statusBar().showMessage(
+                f"UI {ui_fps:.0f} fps | keys repainted/frame {keys_per_frame:.1f} | "
+                f"notes {fx['live']}/{fx['capacity']} (evicted {fx['evicted']}) | "
+                f"paint {paints} x {dirty_frac*100:.0f}% [{self.compositor.breakdown_text()} ms] | "
+                f"audio {self.audio.active_voices()}/{self.audio.max_voices} voices "
+                f"{self.audio.latency_ms:.0f}ms (stolen {self.audio.stolen}, "
+                f"underruns {self.audio_output.underruns}) | "
+                f"beat err {timing['mean_abs_ms']:.1f}/{timing['max_abs_ms']:.1f} ms | "
+                f"hits {judged['perfect']}/{judged['good']}/{judged['miss']}/{judged['stray']}"
+                + (f" (latency {calib:.0f} ms?)" if calib is not None else "") + " | "
+                f"{self.pipeline.stats_text()}"
+                + (f" | {self.governor.text()}" if self.governor is not None else "")
+                + (f" | alloc/frame {self.alloc_meter.avg_bytes/1024:.0f} KB"
+                   if self.alloc_meter is not None else "")
+            )
+            self.ui_frames = 0
+            self.keys_painted = 0
+            self.last_stats_time = now
+        prof.mark("status")
+        prof.frame_end()
+
+        if self.profiler.hud and now - self.last_hud_time >= 0.25:
+            self.update_hud()
+            self.last_hud_time = now
+
+    def update_hud(self):
+        dropped = sum(st.get("dropped", 0) for st in self.pipeline.stats().values())
+        self.hudLabel.setText(
+            f"{self.profiler.fps:.0f} fps | frame {self.profiler.ms.get('frame', 0.0):.1f} ms | "
+            f"dropped {dropped} | predict {self.predict_lead_ms:.0f} ms"
+            + (f" | {self.governor.text()}" if self.governor is not None else "") +
+            f"\n{self.profiler.text(self.HUD_STAGES)}"
+        )
 
-        results = self.hands.process(frame_rgb)
+    def motion_region(self):
+        """
+        Normalised (x0, y0, x1, y1) the motion gate watches: the keyboard
+        plus one keyboard height above it, where the hands come in from.
+        """
+        layout = self.key_layout
+        if not len(layout) or not layout.width:
+            return (0.0, 0.0, 1.0, 1.0)
+        left, top, right, bottom = layout.bounds()
+        top = max(0, top - (bottom - top))
+        return (max(0.0, left / layout.width), top / layout.height,
+                min(1.0, (right + 1) / layout.width), min(1.0, (bottom + 1) / layout.height))
+
+    def apply_quality(self, q):
+        """
+        Pushes one QUALITY_LEVELS entry into the pipeline and layers.
+        """
+        self.camera_layer.smooth = self.preview_smooth and q.smooth_preview
+        self.effects_layer.pool.set_limit(q.particles)
+        if hasattr(self.pipeline, "frame_skip"):
+            self.pipeline.frame_skip = q.frame_skip
+        # in-process inference only; a worker process keeps its startup settings
+        backend = getattr(self.pipeline, "backend", None)
+        if isinstance(backend, ThreadBackend):
+            backend.tracker.limit_side = q.inference_side
+            # remembered even while the first graph is still warming up
+            with self.hands_lock:
+                self.wanted_complexity = q.model_complexity
+                start = not self.hands_building and q.model_complexity != self.model_complexity
+                if start:
+                    self.hands_building = True
+            if start:
+                threading.Thread(target=self.rebuild_hands, args=(backend,),
+                                 name="hands-build", daemon=True).start()
+
+    def toggleHud(self):
+        on = not self.profiler.hud
+        self.profiler.set_hud(on)
+        self.hudLabel.setVisible(on)
+
+    def process_hands(self, result):
+        # landmarks are normalised to the full camera frame, which is stretched
+        # over the compositor => map straight to screen pixels
+        w, h = self.compositor.width(), self.compositor.height()
 
         all_lines = []
         all_points = []
-        touched_now = set()
-
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                pts = []
-                for lm in hand_landmarks.landmark:
-                    px=int(lm.x*w)
-                    py=int(lm.y*h)
-                    pts.append((px,py))
-
-                # skeleton
-                for (start_idx,end_idx) in self.HAND_CONNECTIONS:
-                    sx,sy=pts[start_idx]
-                    ex,ey=pts[end_idx]
-                    all_lines.append([(sx,sy),(ex,ey)])
-                all_points.extend(pts)
-
-                # check fingertip extended
-                for tip_idx,pip_idx in zip(self.FINGER_TIPS,self.FINGER_PIPS):
-                    tip_x,tip_y=pts[tip_idx]
-                    pip_x,pip_y=pts[pip_idx]
-                    if tip_y < pip_y:
-                        # fingertip extended => see if on a key
-                        for (btn,nm) in self.keys_info:
-                            r=btn.geometry()
-                            if (r.left()<=tip_x<=r.right() and
-                                r.top()<=tip_y<=r.bottom()):
-                                touched_now.add(nm)
-
-        # highlight pressed keys in YELLOW, revert others
-        for (btn,nm) in self.keys_info:
-            if nm in touched_now:
-                if not self.is_held[nm]:
-                    # trigger note
-                    self.trigger_note_by_name(nm)
-                    self.is_held[nm]=True
-                # set style => pressed
-                btn.setStyleSheet("background-color: yellow; border: 2px solid black; font-weight: bold;")
-            else:
-                if self.is_held[nm]:
-                    # key was released
-                    self.is_held[nm]=False
-                # revert style to original
-                btn.setStyleSheet(self.keyStyles[nm])
 
-        # Handle missed notes
-        if self.auto_play_muted:
-            current_ms=int(time.time()*1000)
-            to_remove = []
-            for collision in self.collisions:
-                if current_ms - collision['ctime'] > self.tile_score_window_ms:
-                    self.addScore(-2)
-                    to_remove.append(collision)
-            for collision in to_remove:
-                self.collisions.remove(collision)
-
-        self.skeleton_overlay.skeleton_data = all_lines
-        self.skeleton_overlay.points_data = all_points
-        self.skeleton_overlay.update()
-
-        # show camera
-        frame_bgr=cv2.cvtColor(frame_rgb,cv2.COLOR_RGB2BGR)
-        qt_img=QImage(frame_bgr.data,w,h,w*3,QImage.Format_BGR888)
-        pixmap=QPixmap.fromImage(qt_img)
-        pixmap=pixmap.scaled(
-            self.camera_label.width(),
-            self.camera_label.height(),
-            Qt.IgnoreAspectRatio,
-            Qt.SmoothTransformation
+        pts = result.landmarks[:MAX_HANDS, :, :2] * (w, h)
+        tips = pts[:, self.FINGER_TIPS]
+        pips = pts[:, self.FINGER_PIPS]
+        slots = np.arange(len(pts))
+        pressed_at = result.timestamp
+        if self.hand_filter is not None:
+            pts, vel = self.hand_filter.filter(pts, result.timestamp)
+            slots = self.hand_filter.last_slots
+            # hit-test where the fingers are now, not where the camera saw them
+            lead = min(self.max_predict, max(0.0, time.monotonic() - result.timestamp))
+            tips = self.hand_filter.predict(pts[:, self.FINGER_TIPS], vel[:, self.FINGER_TIPS], lead)
+            pips = self.hand_filter.predict(pts[:, self.FINGER_PIPS], vel[:, self.FINGER_PIPS], lead)
+            pressed_at += lead
+            self.predict_lead_ms = 0.9*self.predict_lead_ms + 0.1*lead*1000
+
+        # (hands, 21, 2) screen pixels, truncated like the old int() casts
+        pts_all = pts.astype(np.int32)
+
+        for pts_arr in pts_all:
+            pts = [tuple(p) for p in pts_arr.tolist()]
+
+            # skeleton
+            for (start_idx,end_idx) in self.HAND_CONNECTIONS:
+                sx,sy=pts[start_idx]
+                ex,ey=pts[end_idx]
+                all_lines.append([(sx,sy),(ex,ey)])
+            all_points.extend(pts)
+
+        # fingers laid out by hand slot so each keeps its strike history
+        n_tips = len(self.FINGER_TIPS)
+        finger_tips = np.zeros((MAX_HANDS, n_tips, 2))
+        finger_depth = np.zeros((MAX_HANDS, n_tips))
+        present = np.zeros((MAX_HANDS, n_tips), dtype=bool)
+        extended = np.zeros((MAX_HANDS, n_tips), dtype=bool)
+        finger_tips[slots] = tips
+        finger_depth[slots] = result.landmarks[:len(slots)][:, self.FINGER_TIPS, 2] * w
+        present[slots] = True
+        # extended fingertips (tip above pip), same rule as before
+        extended[slots] = tips[..., 1] < pips[..., 1]
+
+        # only keys whose state flipped get triggered and repainted
+        ons, released = self.press_detector.update(
+            pressed_at, finger_tips.reshape(-1, 2).astype(np.int32), finger_depth.reshape(-1),
+            extended.reshape(-1), present.reshape(-1), self.key_hit_index()
         )
-        self.camera_label.setPixmap(pixmap)
+        for nm, velocity in ons:
+            self.trigger_note_by_name(nm, at=pressed_at, velocity=velocity)
+        # lifting the finger starts the release envelope
+        for nm in released:
+            self.audio.note_off(nm)
+            if self.session_recorder is not None:
+                self.session_recorder.note_off(nm, SOURCE_HAND, pressed_at)
+        self.keyboard.set_pressed([nm for nm, _ in ons], True)
+        self.keyboard.set_pressed(released, False)
+
+        self.skeleton_layer.set_data(all_lines, all_points)
+
+    def show_frame(self, frame):
+        self.camera_layer.set_frame(frame)
+
+    def check_song_finished(self):
+        """
+        Every note released, every tile landed and every target judged =>
+        the run goes to the leaderboard.
+        """
+        if self.scheduler.is_running() or self.tile_layer.engine.count or self.judge.expiry:
+            return
+        title, start_score, start_counts = self.current_song
+        self.current_song = None
+        score = self.score - start_score
+        counts = dict((k, self.judge.counts[k] - start_counts[k]) for k in start_counts)
+        # queried before recording and the new run merged in by hand: the
+        # writer thread commits it some time later
+        best = self.leaderboard.personal_best(self.player, title)
+        top = self.leaderboard.top(title, 3)
+        played_at = time.time()
+        self.leaderboard.record(self.player, title, score, counts, played_at=played_at)
+        if best is None or score > best:
+            msg = f"{title}: {score} points - new personal best!"
+        else:
+            msg = f"{title}: {score} points (best {best})"
+        top = sorted(top + [(self.player, score, played_at)], key=lambda r: (-r[1], r[2]))[:3]
+        if top:
+            msg += " | top: " + ", ".join(f"{p} {s}" for (p, s, _) in top)
+        self.resultLabel.setText(msg)
+
+    def on_replay_finished(self):
+        print(f"Replay finished: score {self.score} | {self.pipeline.stats_text()} | "
+              f"judged {self.judge.stats()}")
+        self.replay_done = True
+        if self.replay_exit:
+            self.close()
 
     def closeEvent(self, event):
-        if self.cap.isOpened():
-            self.cap.release()
-        self.hands.close()
-        pygame.quit()
+        self.timer.stop()
+        # the camera layer points into pipeline memory, let go before stopping it
+        self.camera_layer.set_frame(None)
+        self.pipeline.stop()
+        if self.landmark_recorder is not None:
+            self.landmark_recorder.close()
+        if self.session_recorder is not None:
+            self.session_recorder.close()
+        self.profiler.close()
+        if self.hands is not None:
+            self.hands.close()
+        self.audio_output.stop()
+        self.assets.shutdown()
+        self.leaderboard.close()
+        self.report_startup()
         super().closeEvent(event)
 
+    def report_startup(self):
+        if not self.profile_startup or self.startup.reported:
+            return
+        self.startup.reported = True
+        if self.audio_output.ready_at is not None:
+            self.startup.record("audio out", self.audio_started, self.audio_output.ready_at)
+        print(self.startup.report())
+
 def main():
-    app = QApplication(sys.argv)
-    window = ARPiano()
-    window.show()
+    t_main = time.perf_counter()
+    parser = argparse.ArgumentParser(description="AR Piano Teaching Machine")
+    parser.add_argument("--inference-process", action="store_true",
+                        help="run hand tracking in a separate process (shared-memory frames)")
+    parser.add_argument("--inference-mode", choices=INFERENCE_MODES, default="full",
+                        help="full frame, downscaled frame, or crop around the tracked hands")
+    parser.add_argument("--inference-size", type=int, default=640,
+                        help="long side in pixels of the image given to MediaPipe (downscale/roi)")
+    parser.add_argument("--preview-filter", choices=("fast", "smooth"), default="smooth",
+                        help="filter used when the camera frame is scaled to the window")
+    parser.add_argument("--measure-alloc", action="store_true",
+                        help="show bytes allocated per frame (tracemalloc, slows things down)")
+    parser.add_argument("--audio-buffer", type=int, default=512,
+                        help="mixer block size in samples (smaller => lower latency)")
+    parser.add_argument("--audio-voices", type=int, default=24,
+                        help="maximum simultaneous notes before voice stealing")
+    parser.add_argument("--input-latency", type=float, default=0.0,
+                        help="ms subtracted from every press before it is judged")
+    parser.add_argument("--record-landmarks", metavar="PATH",
+                        help="write every hand-tracking result to a landmark file")
+    parser.add_argument("--replay-landmarks", metavar="PATH",
+                        help="drive the keys from a landmark file instead of the camera")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="replay speed factor, 0 => one record per UI tick")
+    parser.add_argument("--replay-exit", action="store_true",
+                        help="close the window when the replay ends")
+    parser.add_argument("--hud", action="store_true",
+                        help="start with the performance HUD shown (F3 toggles it)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write per-stage timings to a Chrome trace-event JSON file")
+    parser.add_argument("--hand-filter", choices=("one-euro", "off"), default="one-euro",
+                        help="landmark smoothing before key hit testing")
+    parser.add_argument("--max-predict-ms", type=float, default=80,
+                        help="cap on how far fingertips are extrapolated ahead (0 => no prediction)")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="keep full quality instead of adapting it to the frame rate")
+    parser.add_argument("--target-fps", type=float, default=30,
+                        help="GUI tick rate, and the frame rate the quality governor aims for (5-120)")
+    parser.add_argument("--quality-min", type=int, default=0, choices=range(len(QUALITY_LEVELS)),
+                        help=f"best quality level the governor may use (0-{len(QUALITY_LEVELS) - 1})")
+    parser.add_argument("--quality-max", type=int, default=len(QUALITY_LEVELS) - 1,
+                        choices=range(len(QUALITY_LEVELS)),
+                        help="lowest quality level the governor may drop to")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each startup phase took once the first frame is up")
+    parser.add_argument("--keys", default="c4-b5", metavar="LOW-HIGH",
+                        help="key range, e.g. c3-c6, or a0-c8 for all 88 keys")
+    parser.add_argument("--min-key-width", type=int, default=40,
+                        help="narrowest white key in pixels before the keyboard scrolls instead")
+    parser.add_argument("--record-session", metavar="PATH.mid",
+                        help="record every note played to a MIDI file (plus PATH.events, a raw event log)")
+    parser.add_argument("--player", default="player1",
+                        help="name the leaderboard records your results under")
+    parser.add_argument("--no-motion-gate", action="store_true",
+                        help="run hand tracking on every frame, even when nothing moves")
+    args, qt_args = parser.parse_known_args()
+    if args.quality_min > args.quality_max:
+        parser.error("--quality-min must not be above --quality-max")
+
+    startup = StartupProfile(STARTED_AT)
+    startup.record("imports", STARTED_AT, t_main)
+    with startup.phase("qt app"):
+        app = QApplication(sys.argv[:1] + qt_args)
+    t_window = time.perf_counter()
+    window = ARPiano(
+        inference_process=args.inference_process,
+        inference_mode=args.inference_mode,
+        inference_size=args.inference_size,
+        preview_filter=args.preview_filter,
+        measure_alloc=args.measure_alloc,
+        audio_buffer=args.audio_buffer,
+        audio_voices=args.audio_voices,
+        input_latency=args.input_latency,
+        record_landmarks=args.record_landmarks,
+        replay_landmarks=args.replay_landmarks,
+        replay_speed=args.replay_speed,
+        replay_exit=args.replay_exit,
+        hud=args.hud,
+        trace_path=args.trace,
+        hand_filter=args.hand_filter,
+        max_predict_ms=args.max_predict_ms,
+        governor=not args.no_governor,
+        target_fps=args.target_fps,
+        quality_min=args.quality_min,
+        quality_max=args.quality_max,
+        motion_gate=not args.no_motion_gate,
+        startup=startup,
+        profile_startup=args.profile_startup,
+        key_range=args.keys,
+        min_key_w=args.min_key_width,
+        player=args.player,
+        record_session=args.record_session
+    )
+    startup.record("window", t_window)
+    with startup.phase("show"):
+        window.show()
     sys.exit(app.exec_())
 
 if __name__=="__main__":
@@ -0,0 +1,528 @@
+import threading
+import queue
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+from tracking import RoiTracker, MotionGate, GATE_RUN, GATE_REUSE
+
+NUM_LANDMARKS = 21
+
+# same pairs as mediapipe's HAND_CONNECTIONS, so drawing needs no MediaPipe
+HAND_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+)
+
+# One inference result: landmarks is a float32 array of shape (hands, 21, 3)
+# holding MediaPipe's normalised (x, y, z) for every detected hand.
+HandResult = namedtuple("HandResult", ["frame_id", "timestamp", "width", "height", "landmarks"])
+
+HANDS_OPTIONS = dict(
+    static_image_mode=False,
+    max_num_hands=2,
+    min_detection_confidence=0.5,
+    min_tracking_confidence=0.5
+)
+
+# FrameRing header (int64): newest slot, newest frame id, slot inference is
+# reading, slot on screen. -1 means none.
+RING_LATEST_SLOT = 0
+RING_LATEST_ID = 1
+RING_READING = 2
+RING_DISPLAY = 3
+RING_HEADER_LEN = 4
+
+
+def landmarks_to_array(results):
+    """
+    Packs MediaPipe's multi_hand_landmarks into a (hands, 21, 3) float32 array.
+    """
+    if not results.multi_hand_landmarks:
+        return np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+    hands = results.multi_hand_landmarks
+    arr = np.empty((len(hands), NUM_LANDMARKS, 3), dtype=np.float32)
+    for i, hand_landmarks in enumerate(hands):
+        for j, lm in enumerate(hand_landmarks.landmark):
+            arr[i, j, 0] = lm.x
+            arr[i, j, 1] = lm.y
+            arr[i, j, 2] = lm.z
+    return arr
+
+
+def prepare_frame(ring, slot, frame_id, tracker, gate=None, hands_tracked=False):
+    """
+    Motion gate check, then tracker.prepare() for a run, on one ring slot
+    while it is marked as being read. Shared by both inference backends.
+
+    Returns (verdict, rgb, transform); rgb and transform are None unless
+    the verdict is GATE_RUN. None when capture lapped the reader and
+    rewrote the slot meanwhile: the frame must be dropped.
+    """
+    frame = ring.frames[slot]
+    ring.header[RING_READING] = slot
+    verdict = GATE_RUN if gate is None else gate.check(frame, hands_tracked)
+    rgb = transform = None
+    if verdict == GATE_RUN:
+        rgb, transform = tracker.prepare(frame)
+    ring.header[RING_READING] = -1
+    if int(ring.slot_ids[slot]) != frame_id:
+        return None
+    return verdict, rgb, transform
+
+
+class FrameRing:
+    """
+    Fixed ring of preallocated BGR frames plus a small header.
+
+    The capture thread mirrors each camera frame straight into a free slot,
+    inference and display then read that same slot in place, so a frame is
+    written once and never copied between stages. acquire() never hands out
+    the newest slot, the one inference is reading or the one on screen.
+
+    buf lets a subclass place the ring in shared memory.
+    """
+    def __init__(self, width, height, slots=5, buf=None, init=True):
+        self.width = width
+        self.height = height
+        self.slots = slots
+        if buf is None:
+            buf = bytearray(self.nbytes(width, height, slots))
+        header_bytes = 8 * (RING_HEADER_LEN + 2 * slots)
+        self.header = np.ndarray((RING_HEADER_LEN,), dtype=np.int64, buffer=buf)
+        self.slot_ids = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=8 * RING_HEADER_LEN)
+        self.slot_ts = np.ndarray((slots,), dtype=np.float64, buffer=buf,
+                                  offset=8 * (RING_HEADER_LEN + slots))
+        self.frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=buf,
+                                 offset=header_bytes)
+        if init:
+            self.header[:] = -1
+            self.header[RING_LATEST_ID] = 0
+            self.slot_ids[:] = 0
+
+    @staticmethod
+    def nbytes(width, height, slots):
+        return 8 * (RING_HEADER_LEN + 2 * slots) + width * height * 3 * slots
+
+    def acquire(self):
+        """
+        Next slot to write into.
+        """
+        busy = (int(self.header[RING_LATEST_SLOT]), int(self.header[RING_READING]),
+                int(self.header[RING_DISPLAY]))
+        slot = busy[0]
+        for _ in range(self.slots):
+            slot = (slot + 1) % self.slots
+            if slot not in busy:
+                break
+        return slot
+
+    def commit(self, slot, frame_id, ts):
+        self.slot_ids[slot] = frame_id
+        self.slot_ts[slot] = ts
+        self.header[RING_LATEST_SLOT] = slot
+        self.header[RING_LATEST_ID] = frame_id
+
+
+class AllocMeter:
+    """
+    Peak bytes allocated between two tick() calls, via tracemalloc.
+
+    NumPy (and so every array OpenCV hands back) reports to tracemalloc,
+    so this catches per-frame buffers from any thread. Costly => opt-in.
+    """
+    def __init__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+        self.last_bytes = 0
+        self.avg_bytes = 0.0
+
+    def tick(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.last_bytes = max(0, peak - self.base)
+        self.avg_bytes = 0.9 * self.avg_bytes + 0.1 * self.last_bytes
+        tracemalloc.reset_peak()
+        self.base = current
+        return self.last_bytes
+
+    def stop(self):
+        tracemalloc.stop()
+
+
+class StageStats:
+    """
+    Counters for one pipeline stage. Plain ints, only ever bumped by one thread.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.last_ms = 0.0
+
+    def as_dict(self, depth):
+        return {
+            "depth": depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "last_ms": round(self.last_ms, 2),
+        }
+
+
+class LatestSlot:
+    """
+    Single-item mailbox: put() overwrites whatever is waiting, so the reader
+    only ever sees the newest frame. Overwritten items count as drops.
+    """
+    def __init__(self, stats):
+        self.stats = stats
+        self._cond = threading.Condition()
+        self._item = None
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.stats.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def take(self, timeout=None):
+        with self._cond:
+            if self._item is None:
+                self._cond.wait(timeout)
+            item = self._item
+            self._item = None
+            return item
+
+    def depth(self):
+        return 0 if self._item is None else 1
+
+
+class CaptureThread(threading.Thread):
+    """
+    Reads the camera as fast as it delivers and publishes the mirrored frame.
+
+    cap is an opened cv2.VideoCapture, or a function returning one. A
+    function is called on this thread (opening a webcam can take a second
+    or more) and the capture it returns is released when the thread ends.
+    """
+    def __init__(self, cap, pipeline):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.pipeline = pipeline
+        self.stats = StageStats("capture")
+        self.profiler = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        import cv2
+
+        owned = callable(self.cap)
+        if owned:
+            self.cap = self.cap()
+        if self.cap is None or not self.cap.isOpened():
+            print("Warning: Could not open camera.")
+            return
+        try:
+            self._read_loop(cv2)
+        finally:
+            if owned:
+                self.cap.release()
+
+    def _read_loop(self, cv2):
+        frame_id = 0
+        raw = None
+        while not self._stop_event.is_set():
+            t0 = time.perf_counter()
+            # OpenCV decodes into `raw` again once it has the right size
+            ret, raw = self.cap.read(raw)
+            if not ret:
+                raw = None
+                self.stats.dropped += 1
+                time.sleep(0.01)
+                continue
+            h, w, _ = raw.shape
+            ring = self.pipeline.backend.ring_for(w, h)
+            if ring is None:
+                self.stats.dropped += 1
+                continue
+            slot = self.pipeline.acquire_slot(ring)
+            cv2.flip(raw, 1, dst=ring.frames[slot])
+            frame_id += 1
+            ts = time.monotonic()
+            ring.commit(slot, frame_id, ts)
+            self.stats.processed += 1
+            t1 = time.perf_counter()
+            self.stats.last_ms = (t1 - t0) * 1000
+            if self.profiler is not None:
+                self.profiler.complete("capture", t0, t1)
+            self.pipeline.publish_frame(frame_id, ts, slot)
+
+
+class InferenceWorker(threading.Thread):
+    """
+    Runs hands.process on the newest frame only and queues compact results.
+    """
+    def __init__(self, hands, backend, tracker, gate=None):
+        super().__init__(name="inference", daemon=True)
+        self.hands = hands
+        self.backend = backend
+        self.tracker = tracker
+        self.gate = gate
+        self.last_landmarks = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.stats = StageStats("inference")
+        self.profiler = None
+        self._new_hands = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        # wake the thread if it is parked on an empty slot
+        self.backend.slot.put(None)
+
+    def replace_hands(self, hands):
+        """
+        Swaps the hand graph between two frames; the old one is closed here.
+        Also how a graph built in the background is handed over when the
+        worker was started with hands=None.
+        """
+        self._new_hands = hands
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self._new_hands is not None:
+                old, self.hands, self._new_hands = self.hands, self._new_hands, None
+                if old is not None:
+                    old.close()
+            item = self.backend.slot.take(timeout=0.1)
+            if item is None or self.hands is None:
+                continue
+            frame_id, ts, slot = item
+            ring = self.backend.ring
+            t0 = time.perf_counter()
+            prepared = prepare_frame(ring, slot, frame_id, self.tracker, self.gate,
+                                     len(self.last_landmarks) > 0)
+            if prepared is None:
+                # capture lapped us while we were reading, skip this one
+                self.stats.dropped += 1
+                continue
+            verdict, frame_rgb, transform = prepared
+            w, h = ring.width, ring.height
+            if verdict != GATE_RUN:
+                # static frame: nothing new for MediaPipe to find
+                if verdict == GATE_REUSE:
+                    self.backend.publish_result(HandResult(frame_id, ts, w, h, self.last_landmarks))
+                continue
+            t_process = time.perf_counter()
+            results = self.hands.process(frame_rgb)
+            t_done = time.perf_counter()
+            landmarks = self.tracker.reproject(landmarks_to_array(results), transform)
+            self.tracker.update(landmarks, w, h)
+            self.last_landmarks = landmarks
+            self.stats.processed += 1
+            t1 = time.perf_counter()
+            self.stats.last_ms = (t1 - t0) * 1000
+            if self.profiler is not None:
+                self.profiler.complete("hands.process", t_process, t_done)
+                self.profiler.complete("inference", t0, t1)
+            self.backend.publish_result(HandResult(frame_id, ts, w, h, landmarks))
+
+
+class ThreadBackend:
+    """
+    In-process inference: newest-frame slot -> InferenceWorker -> results queue.
+
+    tracker_options go to tracking.RoiTracker (inference mode, max_side, ...),
+    gate_options to tracking.MotionGate; None leaves the gate out.
+    """
+    def __init__(self, hands, max_results=2, tracker_options=None, gate_options=None):
+        self.slot = LatestSlot(StageStats("inference_in"))
+        self.results = queue.Queue(maxsize=max_results)
+        self.results_stats = StageStats("results")
+        self.tracker = RoiTracker(**(tracker_options or {}))
+        self.gate = MotionGate(**gate_options) if gate_options is not None else None
+        self.worker = InferenceWorker(hands, self, self.tracker, self.gate)
+        self.ring = None
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self, timeout=1.0):
+        self.worker.stop()
+        if self.worker.is_alive():
+            self.worker.join(timeout)
+
+    def ring_for(self, width, height):
+        if self.ring is None or (self.ring.width, self.ring.height) != (width, height):
+            # first frame, or the camera switched resolution
+            self.ring = FrameRing(width, height)
+        return self.ring
+
+    def set_gate_region(self, region):
+        if self.gate is not None:
+            self.gate.region = tuple(region)
+
+    def submit(self, frame_id, ts, slot):
+        self.slot.put((frame_id, ts, slot))
+
+    def publish_result(self, result):
+        try:
+            self.results.put_nowait(result)
+        except queue.Full:
+            # GUI is behind => throw away the oldest result, keep the new one
+            try:
+                self.results.get_nowait()
+                self.results_stats.dropped += 1
+            except queue.Empty:
+                pass
+            self.results.put_nowait(result)
+
+    def poll(self):
+        newest = None
+        while True:
+            try:
+                item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if newest is not None:
+                self.results_stats.dropped += 1
+            newest = item
+        if newest is not None:
+            self.results_stats.processed += 1
+        return newest
+
+    def stats(self):
+        return {
+            "inference_in": self.slot.stats.as_dict(self.slot.depth()),
+            "inference": self.worker.stats.as_dict(0),
+            "results": self.results_stats.as_dict(self.results.qsize()),
+            **({"gate": self.gate.stats()} if self.gate is not None else {}),
+        }
+
+
+class FramePipeline:
+    """
+    Capture thread -> inference backend -> newest result for the GUI.
+
+    The GUI calls latest_frame() to paint the camera at its own rate and
+    drain() once per tick to pick up the newest landmarks. Neither call
+    blocks, so a slow hands.process only makes the landmarks older; it never
+    stalls tiles, particles or key repaint.
+
+    backend is a ThreadBackend (default) or hand_worker.ProcessBackend.
+    """
+    def __init__(self, cap, backend):
+        self.backend = backend
+        self.display_stats = StageStats("display")
+
+        self._frame_lock = threading.Lock()
+        self._latest_frame = (0, None)
+        self._displayed_id = 0
+        self._started = False
+        self.frame_skip = 0  # camera frames not sent to inference between two that are
+        self.skipped = 0
+
+        self.capture = CaptureThread(cap, self)
+
+    def start(self):
+        self.backend.start()
+        self.capture.start()
+        self._started = True
+
+    def stop(self, timeout=1.0):
+        if self._started:
+            self.capture.stop()
+            self.capture.join(timeout)
+        # the last frame may be a view into backend memory, let go of it first
+        with self._frame_lock:
+            self._latest_frame = (0, None)
+        self.backend.stop(timeout)
+        self._started = False
+
+    def set_profiler(self, profiler):
+        # in-process stages only; a worker process keeps its own timings
+        self.capture.profiler = profiler
+        worker = getattr(self.backend, "worker", None)
+        if worker is not None:
+            worker.profiler = profiler
+
+    def acquire_slot(self, ring):
+        """
+        ring.acquire() under the frame lock, so it cannot pick the slot
+        latest_frame() is about to claim for display.
+        """
+        with self._frame_lock:
+            return ring.acquire()
+
+    def publish_frame(self, frame_id, ts, slot):
+        with self._frame_lock:
+            self._latest_frame = (frame_id, slot)
+        if self.frame_skip and frame_id % (self.frame_skip + 1):
+            self.skipped += 1
+            return
+        self.backend.submit(frame_id, ts, slot)
+
+    # -- consumer side (GUI thread) --
+
+    def latest_frame(self):
+        """
+        Newest captured frame, or None if it was already handed out.
+
+        The frame is a view into the ring slot, not a copy. The slot stays
+        reserved for display until the next frame is handed out, so it can
+        be painted straight from this memory.
+        """
+        # read and claimed in one step: acquire_slot() takes the same lock,
+        # so capture never starts writing into the slot between the two
+        with self._frame_lock:
+            frame_id, slot = self._latest_frame
+            if slot is None or frame_id == self._displayed_id:
+                return None
+            ring = self.backend.ring
+            ring.header[RING_DISPLAY] = slot
+        if int(ring.slot_ids[slot]) != frame_id:
+            # overwritten before we could claim it, a newer one is coming
+            ring.header[RING_DISPLAY] = -1
+            return None
+        frame = ring.frames[slot]
+        if self._displayed_id and frame_id > self._displayed_id + 1:
+            self.display_stats.dropped += frame_id - self._displayed_id - 1
+        self._displayed_id = frame_id
+        self.display_stats.processed += 1
+        return frame
+
+    def drain(self):
+        """
+        Returns the newest HandResult (or None), discarding any stale ones.
+        """
+        return self.backend.poll()
+
+    def stats(self):
+        """
+        Per-stage queue depth, processed and dropped counts.
+        """
+        s = {"capture": self.capture.stats.as_dict(0)}
+        s.update(self.backend.stats())
+        s["display"] = self.display_stats.as_dict(0)
+        return s
+
+    def stats_text(self):
+        s = self.stats()
+        return (
+            f"capture {s['capture']['processed']} (drop {s['capture']['dropped']}) | "
+            f"infer q{s['inference_in']['depth']} {s['inference']['last_ms']:.0f}ms "
+            f"(stale {s['inference_in']['dropped']}) | "
+            f"results q{s['results']['depth']} (drop {s['results']['dropped']}) | "
+            f"display {s['display']['processed']} (skip {s['display']['dropped']})"
+            + (f" | gate run {s['gate']['ran']} reuse {s['gate']['reused']} "
+               f"skip {s['gate']['skipped']}" if "gate" in s else "")
+        )
@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class _Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.complete(self.name, self.t0, time.perf_counter())
+        return False
+
+
+class StageProfiler:
+    """
+    Per-stage timings for the HUD and an optional Chrome trace file.
+
+    The GUI tick calls frame_begin(), then mark(name) after each stage, then
+    frame_end(); other threads report finished spans with complete(). While
+    neither the HUD nor a trace is on, every hook returns after a single
+    attribute check.
+
+    The trace is written in Chrome's trace-event JSON array format (open it
+    in chrome://tracing or ui.perfetto.dev). Events from any thread queue up
+    in a deque and the GUI thread writes them out at the end of each frame.
+    """
+    def __init__(self, trace_path=None, smoothing=0.1):
+        self.smoothing = smoothing
+        self.hud = False
+        self.trace_path = trace_path
+        self.enabled = False
+        self.ms = {}
+        self.fps = 0.0
+        self.frames = 0
+
+        self._origin = time.perf_counter()
+        self._pending = deque()
+        self._named_threads = set()
+        self._pid = os.getpid()
+        self._frame_t0 = 0.0
+        self._last = 0.0
+        self._last_frame_end = None
+
+        self._trace = None
+        self._trace_events = 0
+        if trace_path:
+            self._trace = open(trace_path, "w")
+            self._trace.write("[\n")
+        self._update_enabled()
+
+    def _update_enabled(self):
+        self.enabled = self.hud or self._trace is not None
+
+    def set_hud(self, on):
+        self.hud = on
+        self._update_enabled()
+
+    def frame_begin(self):
+        if not self.enabled:
+            return
+        self._frame_t0 = self._last = time.perf_counter()
+
+    def mark(self, name):
+        """
+        Closes the stage that ran since the previous mark (or frame_begin).
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.complete(name, self._last, now)
+        self._last = now
+
+    def frame_end(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.complete("frame", self._frame_t0, now)
+        if self._last_frame_end is not None:
+            dt = now - self._last_frame_end
+            if dt > 0:
+                self.fps = (1 - self.smoothing) * self.fps + self.smoothing / dt
+        self._last_frame_end = now
+        self.frames += 1
+        self.flush()
+
+    def section(self, name):
+        """
+        `with profiler.section("name"):` for work outside the tick.
+        """
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def complete(self, name, t0, t1):
+        """
+        A finished span of perf_counter times. Safe from any thread.
+        """
+        if not self.enabled:
+            return
+        ms = (t1 - t0) * 1000.0
+        self.ms[name] = (1 - self.smoothing) * self.ms.get(name, ms) + self.smoothing * ms
+        if self._trace is not None:
+            self._pending.append((name, t0, t1, threading.get_ident(), threading.current_thread().name))
+
+    def flush(self):
+        if self._trace is None:
+            return
+        out = []
+        while self._pending:
+            name, t0, t1, tid, thread_name = self._pending.popleft()
+            if tid not in self._named_threads:
+                self._named_threads.add(tid)
+                out.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                            "args": {"name": thread_name}})
+            out.append({"name": name, "ph": "X", "pid": self._pid, "tid": tid,
+                        "ts": round((t0 - self._origin) * 1e6, 1),
+                        "dur": round((t1 - t0) * 1e6, 1)})
+        for ev in out:
+            if self._trace_events:
+                self._trace.write(",\n")
+            self._trace.write(json.dumps(ev))
+            self._trace_events += 1
+
+    def close(self):
+        if self._trace is not None:
+            self.flush()
+            self._trace.write("\n]\n")
+            self._trace.close()
+            self._trace = None
+            self._update_enabled()
+
+    def text(self, names):
+        """
+        "name ms" for the given stages that have been seen, in that order.
+        """
+        return " ".join(f"{nm} {self.ms[nm]:.1f}" for nm in names if nm in self.ms)
+
+
+class StartupProfile:
+    """
+    Wall-clock phases from launch to the first camera frame, for
+    --profile-startup.
+
+    t0 is the perf_counter time the process started doing anything (taken
+    at the top of piano.py, before the heavy imports). Phases may come from
+    any thread and may overlap; the report lists them by start time, so
+    the background work shows up next to the GUI thread's.
+    """
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.phases = []  # (name, t0, t1), appended from any thread
+        self.first_frame = None
+        self.reported = False
+
+    def record(self, name, t0, t1=None):
+        self.phases.append((name, t0, time.perf_counter() if t1 is None else t1))
+
+    def phase(self, name):
+        """
+        `with startup.phase("name"):`
+        """
+        return _Section(self, name)
+
+    def complete(self, name, t0, t1):
+        # what _Section calls
+        self.record(name, t0, t1)
+
+    def report(self):
+        lines = [f"{'startup phase':<22} {'start ms':>9} {'ms':>8}"]
+        for name, t0, t1 in sorted(self.phases, key=lambda p: p[1]):
+            lines.append(f"{name:<22} {(t0 - self.t0) * 1000:>9.1f} {(t1 - t0) * 1000:>8.1f}")
+        if self.first_frame is not None:
+            lines.append(f"{'first frame':<22} {(self.first_frame - self.t0) * 1000:>9.1f}")
+        else:
+            lines.append("first frame            (none yet)")
+        return "\n".join(lines)
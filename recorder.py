@@ -0,0 +1,248 @@
+import heapq
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from songs import name_to_midi
+
+NOTE_OFF = 0
+NOTE_ON = 1     # held until a NOTE_OFF for the same note
+NOTE_TAP = 2    # no off will come (tile, shortcut, click): ends after tap_s
+
+SOURCE_HAND = 0
+SOURCE_KEY = 1
+SOURCE_TILE = 2
+
+# event log = HEADER_LEN byte header, then EVENT_DTYPE records back to back
+EVENTS_MAGIC = b"ARPEVT\0\0"
+EVENTS_VERSION = 1
+EVENTS_HEADER = struct.Struct("<8sII")  # magic, version, record size
+EVENTS_HEADER_LEN = 16
+EVENT_DTYPE = np.dtype([
+    ("t", "<f8"),        # monotonic seconds
+    ("note", "u1"),      # MIDI number
+    ("velocity", "u1"),  # 0..127
+    ("kind", "u1"),
+    ("source", "u1"),
+    ("pad", "V4"),
+])
+
+TICKS_PER_BEAT = 480
+MIDI_TEMPO = 500000  # µs per beat => 120 bpm, 960 ticks per second
+_END_OF_TRACK = b"\x00\xff\x2f\x00"
+
+
+def _varlen(value):
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.insert(0, 0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(out)
+
+
+class SessionRecorder:
+    """
+    Records every played note to a Standard MIDI File plus a compact event log.
+
+    The GUI thread only writes a few numbers into preallocated ring arrays
+    and bumps a counter: no lock, no allocation, no I/O. One writer thread
+    drains the ring every flush_interval, appends raw events to the log and
+    MIDI events to the track, and rewrites the track length and end marker
+    so the file is playable at any point.
+
+    Events do not arrive in time order: hand presses carry the camera
+    frame time (plus the prediction lead), taps the time they were pushed.
+    The log keeps arrival order; for the MIDI track every drain is sorted
+    by time and the newest reorder_s seconds are held back for the next
+    one, so an event up to reorder_s late still lands on its own tick. If the writer ever falls a full
+    ring behind, new events are dropped (and counted) rather than waiting.
+    Memory stays fixed however long the session runs: the ring, the last
+    reorder_s of events, and one pending note-off per sounding note.
+
+    Single producer: note_on/note_off/tap must all come from one thread.
+    """
+    def __init__(self, midi_path, events_path=None, capacity=4096, flush_interval=0.5,
+                 tap_s=0.25, reorder_s=0.5, channel=0, clock=time.monotonic):
+        self.midi_path = midi_path
+        self.events_path = events_path or os.path.splitext(midi_path)[0] + ".events"
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.tap_s = tap_s
+        self.reorder_s = reorder_s
+        self.channel = channel
+        self.clock = clock
+
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.note = np.zeros(capacity, dtype=np.uint8)
+        self.velocity = np.zeros(capacity, dtype=np.uint8)
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.source = np.zeros(capacity, dtype=np.uint8)
+        self.head = 0   # events written, only the producer moves it
+        self.tail = 0   # events drained, only the writer moves it
+        self.dropped = 0
+        self._midi_numbers = {}
+
+        # writer state
+        self.start_t = None
+        self.last_tick = 0
+        self.events_written = 0
+        self._pending_offs = []   # heap of (t, note)
+        self._sounding = {}       # note => t of its pending off (inf while held)
+        self._batch = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self._held = np.zeros(0, dtype=EVENT_DTYPE)  # drained, not on the track yet
+
+        self._events = open(self.events_path, "wb")
+        header = EVENTS_HEADER.pack(EVENTS_MAGIC, EVENTS_VERSION, EVENT_DTYPE.itemsize)
+        self._events.write(header.ljust(EVENTS_HEADER_LEN, b"\0"))
+        self._midi = open(midi_path, "wb")
+        self._midi.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, TICKS_PER_BEAT))
+        self._track_start = self._midi.tell() + 8
+        tempo = b"\x00\xff\x51\x03" + MIDI_TEMPO.to_bytes(3, "big")
+        self._midi.write(b"MTrk" + struct.pack(">I", 0) + tempo)
+        self._track_end = self._midi.tell()  # where the end-of-track marker goes
+        self._finish_track()
+
+        self._stop_event = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._writer.start()
+
+    # -- producer side (GUI thread) --
+
+    def _push(self, name, kind, velocity, source, at):
+        if self.head - self.tail >= self.capacity:
+            self.dropped += 1
+            return
+        midi = self._midi_numbers.get(name)
+        if midi is None:
+            midi = self._midi_numbers[name] = name_to_midi(name)
+        i = self.head % self.capacity
+        self.t[i] = self.clock() if at is None else at
+        self.note[i] = midi
+        self.velocity[i] = max(1, min(127, int(velocity * 127)))
+        self.kind[i] = kind
+        self.source[i] = source
+        self.head += 1  # publishes the slot
+
+    def note_on(self, name, velocity=1.0, source=SOURCE_HAND, at=None):
+        self._push(name, NOTE_ON, velocity, source, at)
+
+    def note_off(self, name, source=SOURCE_HAND, at=None):
+        self._push(name, NOTE_OFF, 0.0, source, at)
+
+    def tap(self, name, velocity=1.0, source=SOURCE_KEY, at=None):
+        self._push(name, NOTE_TAP, velocity, source, at)
+
+    # -- writer thread --
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self._drain()
+        self._drain(final=True)
+
+    def _drain(self, final=False):
+        head = self.head
+        n = head - self.tail
+        pending = self._held
+        if n > 0:
+            batch = self._batch[:n]
+            idx = np.arange(self.tail, head) % self.capacity
+            batch["t"] = self.t[idx]
+            batch["note"] = self.note[idx]
+            batch["velocity"] = self.velocity[idx]
+            batch["kind"] = self.kind[idx]
+            batch["source"] = self.source[idx]
+            self.tail = head  # slots are free again
+            self._events.write(batch.tobytes())
+            self._events.flush()
+            self.events_written += n
+            pending = np.concatenate([pending, batch])
+        # time order for the track; the newest reorder_s wait for stragglers
+        pending = pending[np.argsort(pending["t"], kind="stable")]
+        ready = len(pending)
+        if not final and ready:
+            ready = int(np.searchsorted(pending["t"], self.clock() - self.reorder_s, side="right"))
+        emit, self._held = pending[:ready], pending[ready:]
+
+        track = bytearray()
+        if len(emit):
+            if self.start_t is None:
+                self.start_t = float(emit["t"][0])
+            for t, note, vel, kind in zip(emit["t"].tolist(), emit["note"].tolist(),
+                                          emit["velocity"].tolist(), emit["kind"].tolist()):
+                self._offs_until(track, t)
+                if kind == NOTE_OFF:
+                    if self._sounding.pop(note, None) is not None:
+                        self._emit(track, t, 0x80, note, 0)
+                    continue
+                if note in self._sounding:
+                    self._emit(track, t, 0x80, note, 0)  # restruck before it ended
+                self._emit(track, t, 0x90, note, vel)
+                off_t = t + self.tap_s if kind == NOTE_TAP else float("inf")
+                self._sounding[note] = off_t
+                if kind == NOTE_TAP:
+                    heapq.heappush(self._pending_offs, (off_t, note))
+        if final:
+            self._offs_until(track, float("inf"))
+            for note in list(self._sounding):
+                self._emit(track, None, 0x80, note, 0)  # still held: ends with the track
+            self._sounding.clear()
+        if track:
+            self._midi.seek(self._track_end)
+            self._midi.write(track)
+            self._track_end = self._midi.tell()
+            self._finish_track()
+
+    def _offs_until(self, track, t):
+        # taps whose time is up, in time order; a restruck note's old off is stale
+        while self._pending_offs and self._pending_offs[0][0] <= t:
+            off_t, note = heapq.heappop(self._pending_offs)
+            if self._sounding.get(note) == off_t:
+                del self._sounding[note]
+                self._emit(track, off_t, 0x80, note, 0)
+
+    def _emit(self, track, t, status, note, velocity):
+        tick = self.last_tick
+        if t is not None:
+            tick = max(tick, int(round((t - self.start_t) * 1e6 / MIDI_TEMPO * TICKS_PER_BEAT)))
+        track += _varlen(tick - self.last_tick)
+        track += bytes((status | self.channel, note, velocity))
+        self.last_tick = tick
+
+    def _finish_track(self):
+        self._midi.seek(self._track_end)
+        self._midi.write(_END_OF_TRACK)
+        self._midi.truncate()
+        length = self._midi.tell() - self._track_start
+        self._midi.seek(self._track_start - 4)
+        self._midi.write(struct.pack(">I", length))
+        self._midi.flush()
+
+    def close(self, timeout=2.0):
+        """
+        Stops the writer after a last drain; every note still sounding is ended.
+        """
+        if self._writer is None:
+            return
+        self._stop_event.set()
+        self._writer.join(timeout)
+        self._writer = None
+        self._midi.close()
+        self._events.close()
+
+
+def read_events(path):
+    """
+    Event log => structured array of EVENT_DTYPE (memory-mapped).
+    """
+    with open(path, "rb") as f:
+        magic, version, itemsize = EVENTS_HEADER.unpack(f.read(EVENTS_HEADER.size))
+    if magic != EVENTS_MAGIC or version != EVENTS_VERSION or itemsize != EVENT_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a session event log")
+    n = (os.path.getsize(path) - EVENTS_HEADER_LEN) // itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=EVENT_DTYPE)
+    return np.memmap(path, dtype=EVENT_DTYPE, mode="r", offset=EVENTS_HEADER_LEN, shape=(n,))
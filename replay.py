@@ -0,0 +1,157 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+from pipeline import HandResult, StageStats, NUM_LANDMARKS
+from hand_worker import MAX_HANDS
+
+# file = HEADER_LEN byte header, then fixed-size records back to back, so
+# the body can be memory-mapped as one structured array
+MAGIC = b"ARPLMK\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIII")  # magic, version, max hands, landmarks, record size
+HEADER_LEN = 32
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"),            # monotonic capture time
+    ("frame_id", "<i8"),
+    ("width", "<u2"),
+    ("height", "<u2"),
+    ("hands", "<u1"),
+    ("pad", "V3"),
+    ("landmarks", "<f4", (MAX_HANDS, NUM_LANDMARKS, 3)),
+])
+
+
+class LandmarkRecorder:
+    """
+    Appends every HandResult the app consumes to a landmark file.
+
+    One record is packed into a reused buffer and written out, so recording
+    costs a few hundred bytes of buffered I/O per result.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._record = np.zeros(1, dtype=RECORD_DTYPE)
+        self._file = open(path, "wb")
+        header = HEADER.pack(MAGIC, VERSION, MAX_HANDS, NUM_LANDMARKS, RECORD_DTYPE.itemsize)
+        self._file.write(header.ljust(HEADER_LEN, b"\0"))
+
+    def write(self, result):
+        rec = self._record[0]
+        hands = min(len(result.landmarks), MAX_HANDS)
+        rec["t"] = result.timestamp
+        rec["frame_id"] = result.frame_id
+        rec["width"] = result.width
+        rec["height"] = result.height
+        rec["hands"] = hands
+        rec["landmarks"][:hands] = result.landmarks[:hands]
+        rec["landmarks"][hands:] = 0.0
+        self._file.write(self._record.tobytes())
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LandmarkRecording:
+    """
+    Read-only view of a landmark file. The record count comes from the file
+    size, so a recording cut short by a crash still replays.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, max_hands, landmarks, itemsize = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a landmark recording")
+        if (max_hands, landmarks, itemsize) != (MAX_HANDS, NUM_LANDMARKS, RECORD_DTYPE.itemsize):
+            raise ValueError(f"{path} uses an incompatible record layout")
+        n = (os.path.getsize(path) - HEADER_LEN) // itemsize
+        if n > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_LEN, shape=(n,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.times = self.records["t"]
+
+    def __len__(self):
+        return len(self.records)
+
+    def duration(self):
+        return float(self.times[-1] - self.times[0]) if len(self) else 0.0
+
+    def result(self, i, timestamp=None):
+        rec = self.records[i]
+        hands = int(rec["hands"])
+        return HandResult(
+            int(rec["frame_id"]),
+            float(rec["t"]) if timestamp is None else timestamp,
+            int(rec["width"]), int(rec["height"]),
+            np.array(rec["landmarks"][:hands]),
+        )
+
+
+class ReplayPipeline:
+    """
+    Drop-in for FramePipeline that plays a LandmarkRecording instead of a
+    camera: no capture, no MediaPipe, no frames to paint.
+
+    speed 1.0 replays in recorded time, 2.0 twice as fast; the newest due
+    record is handed out per drain() and skipped ones count as drops, just
+    like the live pipeline. speed 0 hands out every record, one per drain(),
+    as fast as the GUI ticks. Timestamps are moved onto the current
+    monotonic clock so scoring sees them as live presses.
+    """
+    def __init__(self, recording, speed=1.0, clock=time.monotonic):
+        self.recording = recording
+        self.speed = speed
+        self.clock = clock
+        self.stats_replay = StageStats("replay")
+        self._next = 0
+        self._start = None
+
+    def start(self):
+        self._start = self.clock()
+        self._next = 0
+
+    def stop(self, timeout=1.0):
+        self._start = None
+
+    def set_profiler(self, profiler):
+        pass
+
+    def finished(self):
+        return self._next >= len(self.recording)
+
+    def latest_frame(self):
+        return None
+
+    def drain(self):
+        if self._start is None or self.finished():
+            return None
+        rec = self.recording
+        t0 = float(rec.times[0])
+        if self.speed <= 0:
+            i = self._next
+            ts = self.clock()
+        else:
+            due = t0 + (self.clock() - self._start) * self.speed
+            i = int(np.searchsorted(rec.times, due, side="right")) - 1
+            if i < self._next:
+                return None
+            ts = self._start + (float(rec.times[i]) - t0) / self.speed
+        self.stats_replay.dropped += i - self._next
+        self.stats_replay.processed += 1
+        self._next = i + 1
+        return rec.result(i, timestamp=ts)
+
+    def stats(self):
+        return {"replay": self.stats_replay.as_dict(len(self.recording) - self._next)}
+
+    def stats_text(self):
+        s = self.stats()["replay"]
+        return f"replay {s['processed']}/{len(self.recording)} (skip {s['dropped']})"
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import struct
+
+import numpy as np
+
+from audio import load_wav, resample
+from layout import LOWEST_KEY, HIGHEST_KEY
+from songs import midi_to_name, name_to_midi
+
+# file = HEADER_LEN byte header, the index (one INDEX_DTYPE row per note),
+# then every note's float32 PCM back to back; all of it is memory-mapped
+BANK_MAGIC = b"ARPBANK\0"
+BANK_VERSION = 2  # 2: recorded notes are no longer cut
+HEADER = struct.Struct("<8sIII20s")  # magic, version, sample rate, notes, sources digest
+HEADER_LEN = 64
+
+INDEX_DTYPE = np.dtype([
+    ("note", "<i2"),     # MIDI number
+    ("source", "<i2"),   # MIDI number of the recording it was made from
+    ("pad", "V4"),
+    ("offset", "<i8"),   # in samples from the start of the PCM block
+    ("length", "<i8"),
+])
+
+
+def recorded_notes(directory):
+    """
+    {midi: path} for every WAV in directory named after a note (c4.wav, c40.wav, ...).
+    """
+    found = {}
+    if not os.path.isdir(directory):
+        return found
+    with os.scandir(directory) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            if not entry.is_file() or ext.lower() != ".wav":
+                continue
+            try:
+                found[name_to_midi(stem)] = entry.path
+            except (ValueError, IndexError):
+                pass  # not a note name
+    return found
+
+
+def sources_digest(sources, sample_rate, low, high):
+    """
+    Changes whenever a recording is added, removed or modified, or the
+    bank settings change; a bank with another digest is rebuilt.
+    """
+    h = hashlib.sha1(b"v%d %d %d %d" % (BANK_VERSION, sample_rate, low, high))
+    for midi in sorted(sources):
+        st = os.stat(sources[midi])
+        h.update(b"%d %d %d;" % (midi, st.st_size, st.st_mtime_ns))
+    return h.digest()
+
+
+def nearest_source(midi, recorded):
+    """
+    Closest recorded note; on a tie the lower one (shifting up shortens
+    the sample instead of stretching it).
+    """
+    return min(recorded, key=lambda m: (abs(m - midi), m))
+
+
+def pitch_shift(data, semitones):
+    """
+    Resampling shift: up by `semitones` also makes the note shorter.
+    """
+    if semitones == 0:
+        return data
+    return resample(data, 2.0 ** (semitones / 12.0), 1.0)
+
+
+def build_bank(path, sources, sample_rate, low=LOWEST_KEY, high=HIGHEST_KEY,
+               decode=None, max_seconds=4.0, fade_ms=60):
+    """
+    Writes a bank with every note from low to high. Notes without a
+    recording are pitch-shifted from the nearest one and cut to
+    max_seconds (with a short fade) so deep notes stretched from a middle-C
+    recording do not balloon the file.
+
+    decode(paths) -> list of mono float32 arrays at sample_rate; defaults
+    to load_wav one file after the other.
+    """
+    if not sources:
+        raise ValueError("no recorded notes to build a sample bank from")
+    recorded = sorted(sources)
+    if decode is None:
+        decode = lambda paths: [load_wav(p, sample_rate) for p in paths]
+    decoded = dict(zip(recorded, decode([sources[m] for m in recorded])))
+
+    max_len = int(max_seconds * sample_rate)
+    fade = int(fade_ms * sample_rate / 1000)
+    notes = np.arange(low, high + 1)
+    index = np.zeros(len(notes), dtype=INDEX_DTYPE)
+    pcm = []
+    offset = 0
+    for i, midi in enumerate(notes):
+        src = nearest_source(int(midi), recorded)
+        data = pitch_shift(decoded[src], int(midi) - src)
+        if src != midi and len(data) > max_len:
+            data = data[:max_len].copy()
+            n = min(fade, len(data))
+            data[-n:] *= np.linspace(1.0, 0.0, n, dtype=np.float32)
+        index[i] = (midi, src, b"", offset, len(data))
+        pcm.append(np.asarray(data, dtype="<f4"))
+        offset += len(data)
+
+    digest = sources_digest(sources, sample_rate, low, high)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(BANK_MAGIC, BANK_VERSION, sample_rate, len(notes), digest).ljust(HEADER_LEN, b"\0"))
+        f.write(index.tobytes())
+        for data in pcm:
+            f.write(data.tobytes())
+    os.replace(tmp, path)
+
+
+class SampleBank:
+    """
+    Read-only view of a bank file. sample() hands out slices of the
+    memory map, so nothing is decoded or copied when the bank opens and
+    only the pages of notes actually played become resident.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, rate, count, digest = HEADER.unpack(f.read(HEADER.size))
+        if magic != BANK_MAGIC or version != BANK_VERSION:
+            raise ValueError(f"{path} is not a sample bank")
+        self.path = path
+        self.sample_rate = rate
+        self.digest = digest
+        self.index = np.memmap(path, dtype=INDEX_DTYPE, mode="r", offset=HEADER_LEN, shape=(count,))
+        pcm_offset = HEADER_LEN + count * INDEX_DTYPE.itemsize
+        total = int(self.index["offset"][-1] + self.index["length"][-1]) if count else 0
+        self.pcm = np.memmap(path, dtype="<f4", mode="r", offset=pcm_offset, shape=(max(1, total),))
+        self.rows = dict((midi_to_name(int(m)), i) for i, m in enumerate(self.index["note"]))
+
+    @classmethod
+    def load_or_build(cls, directory, path, sample_rate, low=LOWEST_KEY, high=HIGHEST_KEY,
+                      decode=None):
+        """
+        Maps the bank at `path`, building it first when it is missing or
+        the recordings in `directory` changed since it was built.
+        """
+        sources = recorded_notes(directory)
+        digest = sources_digest(sources, sample_rate, low, high)
+        try:
+            bank = cls(path)
+            if bank.digest == digest:
+                return bank
+        except (OSError, ValueError, struct.error):
+            pass  # missing or damaged => build it
+        build_bank(path, sources, sample_rate, low, high, decode=decode)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.index)
+
+    def names(self):
+        return list(self.rows)
+
+    def has(self, name):
+        return name in self.rows
+
+    def sample(self, name):
+        row = self.index[self.rows[name]]
+        start = int(row["offset"])
+        return self.pcm[start:start + int(row["length"])]
+
+    def source(self, name):
+        """
+        Name of the recording a note was made from (itself when recorded).
+        """
+        return midi_to_name(int(self.index[self.rows[name]]["source"]))
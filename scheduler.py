@@ -0,0 +1,139 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from songs import Timeline
+
+# beat: monotonic time the tile should reach the key line
+# spawn: monotonic time the tile has to start falling to make it
+ScheduledNote = namedtuple("ScheduledNote", ["index", "note", "beat", "spawn"])
+
+
+class MelodyScheduler:
+    """
+    Plays a song Timeline (or a melody of (note, delta_ms)) against the
+    monotonic clock.
+
+    Score times are absolute, and score time maps to
+    wall time through a single (anchor_wall, anchor_score, tempo) triple,
+    so nothing accumulates between notes and long songs do not drift. Each
+    tile is released fall_time(note) before its beat, with a small
+    lookahead so a late tick never makes it late. Tempo changes move the
+    anchor to the current beat position and only re-time what is left.
+    """
+    def __init__(self, lookahead=0.05, clock=time.monotonic):
+        self.lookahead = lookahead
+        self.clock = clock
+        self.timeline = Timeline.from_melody([])
+        self.next_index = 0
+        self.tempo = 1.0
+        self.anchor_wall = 0.0
+        self.anchor_score = 0.0
+        self.errors_ms = {}
+        self.last_beat = None  # (score_ms, wall) of the newest released note
+
+    def start(self, melody, tempo, fall_time, now=None):
+        """
+        fall_time(note) => seconds a tile needs from spawn to the key line.
+        The first tile is released right away.
+        """
+        now = self.clock() if now is None else now
+        if not isinstance(melody, Timeline):
+            melody = Timeline.from_melody(melody)
+        self.timeline = melody
+        self.next_index = 0
+        self.tempo = tempo
+        self.errors_ms = {}
+        self.last_beat = None
+        lead_in = max([fall_time(nm) for nm in melody.note_names()] or [0.0])
+        self.anchor_score = float(melody.time_ms[0]) if len(melody) else 0.0
+        self.anchor_wall = now + lead_in
+
+    def stop(self):
+        self.next_index = len(self.timeline)
+
+    def is_running(self):
+        return self.next_index < len(self.timeline)
+
+    def beat_time(self, i):
+        return self.anchor_wall + (float(self.timeline.time_ms[i]) - self.anchor_score) / (1000.0 * self.tempo)
+
+    def set_tempo(self, tempo, now=None):
+        """
+        Keeps the current beat position and re-times every note not yet released.
+        """
+        now = self.clock() if now is None else now
+        if tempo == self.tempo:
+            return
+        anchor_wall = now
+        anchor_score = self.anchor_score + (now - self.anchor_wall) * 1000.0 * self.tempo
+        if self.last_beat is not None and self.last_beat[1] > now:
+            # tiles already falling keep their beats; continue from the last one
+            anchor_score, anchor_wall = self.last_beat
+        self.anchor_score = anchor_score
+        self.anchor_wall = anchor_wall
+        self.tempo = tempo
+
+    def due(self, fall_time, now=None):
+        """
+        Notes whose tiles must be released by now + lookahead, in order.
+        """
+        now = self.clock() if now is None else now
+        out = []
+        while self.next_index < len(self.timeline):
+            i = self.next_index
+            note = self.timeline.note_name(i)
+            beat = self.beat_time(i)
+            spawn = beat - fall_time(note)
+            if spawn > now + self.lookahead:
+                break
+            out.append(ScheduledNote(i, note, beat, spawn))
+            self.last_beat = (float(self.timeline.time_ms[i]), beat)
+            self.next_index += 1
+        return out
+
+    def record_arrival(self, index, error_ms):
+        """
+        How late (positive) or early the tile for note `index` was seen on the key line.
+        """
+        self.errors_ms[index] = error_ms
+
+    def report(self):
+        errs = np.array(list(self.errors_ms.values())) if self.errors_ms else np.zeros(0)
+        return {
+            "events": len(self.timeline),
+            "measured": len(errs),
+            "errors_ms": dict(self.errors_ms),
+            "mean_abs_ms": float(np.abs(errs).mean()) if len(errs) else 0.0,
+            "max_abs_ms": float(np.abs(errs).max()) if len(errs) else 0.0,
+        }
+
+
+def simulate_schedule(melody, tempo=1.0, fall_time=2.0, tick_ms=30.0, jitter_ms=10.0,
+                      tempo_changes=(), seed=0):
+    """
+    Runs a MelodyScheduler on a virtual clock with a jittery tick, the way the
+    GUI timer drives it, and reports per-event timing error. Tiles are
+    modelled exactly as TileEngine moves them (released at their ideal spawn
+    time), so the error is what the tick period and jitter add on top.
+
+    tempo_changes: iterable of (wall_s, tempo) applied during the run.
+    """
+    rng = np.random.default_rng(seed)
+    sched = MelodyScheduler()
+    fall = lambda note: fall_time
+    now = 0.0
+    sched.start(melody, tempo, fall, now=now)
+    changes = sorted(tempo_changes)
+    falling = []  # (index, arrival)
+    while sched.is_running() or falling:
+        now += max(0.0, tick_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000.0
+        while changes and changes[0][0] <= now:
+            sched.set_tempo(changes.pop(0)[1], now=now)
+        for ev in sched.due(fall, now=now):
+            falling.append((ev.index, ev.spawn + fall_time))
+        for item in [f for f in falling if f[1] <= now]:
+            falling.remove(item)
+            sched.record_arrival(item[0], (now - item[1]) * 1000.0)
+    return sched.report()
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+
+from hand_worker import MAX_HANDS
+from pipeline import NUM_LANDMARKS
+
+
+class OneEuroLandmarks:
+    """
+    One-Euro filter over every landmark coordinate of every hand at once.
+
+    Each coordinate gets its own adaptive low-pass: slow movement is
+    smoothed hard (no jitter at key edges), fast movement lowers the
+    smoothing so the filter does not lag a real press. The filtered
+    velocity it keeps along the way is what predict() extrapolates with.
+
+    Hands are kept in fixed slots; each new frame's hands are matched to
+    the slots by wrist distance because MediaPipe does not keep their order.
+    A hand that appears in a slot that was empty starts unfiltered.
+
+    min_cutoff is in Hz, beta in 1/(input units); tuned for screen pixels.
+    """
+    def __init__(self, max_hands=MAX_HANDS, min_cutoff=1.0, beta=0.007, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x_hat = np.zeros((max_hands, NUM_LANDMARKS, 2))
+        self.dx_hat = np.zeros((max_hands, NUM_LANDMARKS, 2))
+        self.valid = np.zeros(max_hands, dtype=bool)
+        self.last_t = None
+        self.last_slots = np.zeros(0, dtype=np.intp)  # slot of each hand passed to filter()
+
+    def reset(self):
+        self.valid[:] = False
+        self.last_t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+
+    def _assign(self, points):
+        # slot per incoming hand, preferring the slot whose wrist is closest
+        n = len(points)
+        slots = list(range(n))
+        if n == 0 or not self.valid.any():
+            return slots
+        wrists = points[:, 0]
+        prev = self.x_hat[:, 0]
+        if n == 1:
+            dist = np.where(self.valid, np.linalg.norm(prev - wrists[0], axis=1), np.inf)
+            return [int(np.argmin(dist))]
+        if n == 2 and self.valid[:2].all():
+            keep = np.linalg.norm(wrists - prev[:2], axis=1).sum()
+            swap = np.linalg.norm(wrists - prev[1::-1], axis=1).sum()
+            if swap < keep:
+                return [1, 0]
+        return slots
+
+    def filter(self, points, t):
+        """
+        points: (hands, 21, 2) positions at monotonic time t.
+        Returns (smoothed, velocity per second), both (hands, 21, 2).
+        """
+        points = np.asarray(points, dtype=np.float64)[:len(self.valid)]
+        slots = np.array(self._assign(points), dtype=np.intp)
+        self.last_slots = slots
+        dt = (t - self.last_t) if self.last_t is not None else 0.0
+        if dt <= 0.0:
+            dt = 1.0 / 30
+        self.last_t = t
+
+        fresh = ~self.valid[slots]
+        prev = self.x_hat[slots]
+        prev[fresh] = points[fresh]
+        prev_dx = self.dx_hat[slots]
+        prev_dx[fresh] = 0.0
+
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx = prev_dx + a_d * ((points - prev) / dt - prev_dx)
+        cutoff = self.min_cutoff + self.beta * np.abs(dx)
+        a = 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+        x = prev + a * (points - prev)
+
+        self.valid[:] = False
+        self.valid[slots] = True
+        self.x_hat[slots] = x
+        self.dx_hat[slots] = dx
+        return x, dx
+
+    @staticmethod
+    def predict(points, velocity, lead):
+        """
+        Positions `lead` seconds ahead at constant velocity.
+        """
+        if lead <= 0.0:
+            return points
+        return points + velocity * lead
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+SONG_EXTENSIONS = (".json", ".txt", ".mid", ".midi")
+TIMELINE_VERSION = 1
+
+# one row per note; rows sharing `chord` start together
+TIMELINE_DTYPE = np.dtype([
+    ("time_ms", "<f8"),      # absolute start
+    ("duration_ms", "<f4"),
+    ("note", "<i2"),         # MIDI number, 60 => c4
+    ("chord", "<u4"),
+])
+
+# sound files name sharps with a trailing 0: c40 is C#4
+PITCH_NAMES = ["c", "c0", "d", "d0", "e", "f", "f0", "g", "g0", "a", "a0", "b"]
+DEFAULT_DURATION_MS = 400
+
+
+def midi_to_name(number):
+    name = PITCH_NAMES[number % 12]
+    return f"{name[0]}{number // 12 - 1}{name[1:]}"
+
+
+def name_to_midi(name):
+    letter, rest = name[0].lower(), name[1:]
+    sharp = rest.endswith("0") and len(rest) > 1
+    octave = int(rest[:-1] if sharp else rest)
+    return (octave + 1) * 12 + PITCH_NAMES.index(letter + ("0" if sharp else ""))
+
+
+class Timeline:
+    """
+    A compiled song: TIMELINE_DTYPE rows sorted by start time.
+
+    Backed by a read-only memmap when it comes from the cache, so a long
+    piece only pages in the part the scheduler is currently reading.
+    """
+    def __init__(self, events, title=""):
+        self.events = events
+        self.title = title
+
+    @classmethod
+    def from_melody(cls, melody, title=""):
+        """
+        melody: [(note_or_chord, delta_ms[, duration_ms])], the old in-code
+        format. A chord is "c4+e4" or a list of names; delta 0 also stacks.
+        """
+        rows = []
+        t = 0.0
+        for item in melody:
+            notes, delta = item[0], float(item[1])
+            duration = float(item[2]) if len(item) > 2 else DEFAULT_DURATION_MS
+            t += delta
+            if isinstance(notes, str):
+                notes = notes.split("+")
+            for nm in notes:
+                rows.append((t, duration, name_to_midi(nm), 0))
+        return cls(_finish(rows), title)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def time_ms(self):
+        return self.events["time_ms"]
+
+    def note_name(self, i):
+        return midi_to_name(int(self.events["note"][i]))
+
+    def note_names(self):
+        return [midi_to_name(int(n)) for n in np.unique(self.events["note"])]
+
+    def duration_ms(self):
+        if not len(self.events):
+            return 0.0
+        return float((self.events["time_ms"] + self.events["duration_ms"]).max())
+
+
+def _finish(rows):
+    events = np.array(rows, dtype=TIMELINE_DTYPE)
+    events = events[np.argsort(events["time_ms"], kind="stable")]
+    if len(events):
+        starts = np.concatenate(([True], np.diff(events["time_ms"]) > 0))
+        events["chord"] = np.cumsum(starts) - 1
+    return events
+
+
+def parse_json(data):
+    """
+    {"notes": [["g4", 0], ["c5+e5", 800, 600], ...]}
+    """
+    doc = json.loads(data.decode("utf-8"))
+    return Timeline.from_melody(doc["notes"]).events
+
+
+def parse_text(data):
+    """
+    One event per line: `note[+note...] delta_ms [duration_ms]`, # comments.
+    """
+    melody = []
+    for line in data.decode("utf-8").splitlines():
+        line = line.split("#", 1)[0].split()
+        if line:
+            melody.append(line)
+    return Timeline.from_melody(melody).events
+
+
+def _varlen(data, pos):
+    value = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            return value, pos
+
+
+def parse_midi(data):
+    """
+    Standard MIDI file (format 0 or 1) => timeline rows. Every channel is
+    merged; tempo changes on any track apply to all of them.
+    """
+    if data[:4] != b"MThd":
+        raise ValueError("not a MIDI file")
+    hlen, _fmt, ntracks, division = struct.unpack(">IHHH", data[4:14])
+    pos = 8 + hlen
+    notes = []   # (tick, on, (channel, note))
+    tempos = [(0, 500000)]
+    for _ in range(ntracks):
+        if data[pos:pos+4] != b"MTrk":
+            raise ValueError("bad MIDI track header")
+        length = struct.unpack(">I", data[pos+4:pos+8])[0]
+        pos += 8
+        end = pos + length
+        tick = 0
+        status = 0
+        while pos < end:
+            delta, pos = _varlen(data, pos)
+            tick += delta
+            if data[pos] & 0x80:
+                status = data[pos]
+                pos += 1
+            kind = status & 0xF0
+            if status == 0xFF:
+                meta = data[pos]
+                mlen, pos = _varlen(data, pos + 1)
+                if meta == 0x51 and mlen == 3:
+                    tempos.append((tick, int.from_bytes(data[pos:pos+3], "big")))
+                pos += mlen
+            elif status in (0xF0, 0xF7):
+                slen, pos = _varlen(data, pos)
+                pos += slen
+            elif kind in (0x80, 0x90):
+                note, vel = data[pos], data[pos+1]
+                pos += 2
+                notes.append((tick, 1 if kind == 0x90 and vel else 0, (status & 0x0F, note)))
+            elif kind in (0xC0, 0xD0):
+                pos += 1
+            else:
+                pos += 2
+        pos = end
+
+    # tick => ms through the tempo map
+    tempos.sort(key=lambda t: t[0])
+    if division & 0x8000:
+        fps = 256 - (division >> 8)
+        ms_per_tick = 1000.0 / (fps * (division & 0xFF))
+        to_ms = lambda tick: tick * ms_per_tick
+    else:
+        marks = []
+        ms = 0.0
+        prev_tick, prev_tempo = 0, tempos[0][1]
+        for t, tempo in tempos:
+            ms += (t - prev_tick) * prev_tempo / 1000.0 / division
+            marks.append((t, ms, tempo))
+            prev_tick, prev_tempo = t, tempo
+        ticks = np.array([m[0] for m in marks])
+
+        def to_ms(tick):
+            k = int(np.searchsorted(ticks, tick, side="right")) - 1
+            t, ms, tempo = marks[k]
+            return ms + (tick - t) * tempo / 1000.0 / division
+
+    rows = []
+    open_notes = {}
+    # offs before ons at the same tick so repeated notes do not swallow each other
+    for tick, on, key in sorted(notes, key=lambda n: (n[0], n[1])):
+        if on:
+            open_notes.setdefault(key, []).append(tick)
+        elif open_notes.get(key):
+            start = open_notes[key].pop(0)
+            rows.append((to_ms(start), to_ms(tick) - to_ms(start), key[1], 0))
+    for key, starts in open_notes.items():
+        for start in starts:
+            rows.append((to_ms(start), DEFAULT_DURATION_MS, key[1], 0))
+    return _finish(rows)
+
+
+PARSERS = {".json": parse_json, ".txt": parse_text, ".mid": parse_midi, ".midi": parse_midi}
+
+
+def song_title(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.replace("_", " ").replace("-", " ").title()
+
+
+class SongLibrary:
+    """
+    Songs are files in one directory; titles come from file names, so
+    listing them never opens a file. load() compiles a song to a binary
+    timeline the first time and memory-maps the cached copy afterwards,
+    keyed by a hash of the file contents.
+    """
+    def __init__(self, directory, cache_dir=None):
+        self.directory = directory
+        self.cache_dir = cache_dir or os.path.join(directory, ".cache")
+
+    def songs(self):
+        """
+        [(title, path)] sorted by title.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in SONG_EXTENSIONS:
+                    found.append((song_title(entry.name), entry.path))
+        return sorted(found)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data + b"v%d" % TIMELINE_VERSION).hexdigest()
+        cached = os.path.join(self.cache_dir, digest + ".npy")
+        if os.path.exists(cached):
+            try:
+                return Timeline(np.load(cached, mmap_mode="r"), song_title(path))
+            except (ValueError, OSError):
+                pass  # damaged cache file => compile again
+
+        events = PARSERS[os.path.splitext(path)[1].lower()](data)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = cached + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, events)
+            os.replace(tmp, cached)
+        except OSError as e:
+            print(f"Warning: could not cache timeline for {path}: {e}")
+        return Timeline(events, song_title(path))
@@ -0,0 +1,107 @@
+import numpy as np
+
+TILE_FALLING = 0
+TILE_FINISHED = 1
+
+
+class TileEngine:
+    """
+    Falling tiles as struct-of-arrays NumPy buffers.
+
+    A tile's y is a pure function of time: y0 + speed * (now - t0), so the
+    position never depends on how regularly the timer fires. step() moves
+    every tile and finds key-line crossings in one vectorised pass; drawing
+    is left to whoever owns the engine.
+    """
+    def __init__(self, capacity=64):
+        self.count = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = self.count
+        def grow(arr, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            if arr is not None:
+                new[:old] = arr[:old]
+            return new
+        self.note = grow(getattr(self, "note", None), np.int32)
+        self.x = grow(getattr(self, "x", None), np.float32)
+        self.y = grow(getattr(self, "y", None), np.float32)
+        self.y0 = grow(getattr(self, "y0", None), np.float64)
+        self.t0 = grow(getattr(self, "t0", None), np.float64)
+        self.speed = grow(getattr(self, "speed", None), np.float32)
+        self.size = grow(getattr(self, "size", None), np.float32)
+        self.key_top = grow(getattr(self, "key_top", None), np.float32)
+        self.state = grow(getattr(self, "state", None), np.int8)
+        self.tag = grow(getattr(self, "tag", None), np.int32)
+        self.capacity = capacity
+
+    def spawn(self, note, x, size, key_top, speed, now, y0=None, tag=-1):
+        """
+        speed is in pixels per second. By default the tile starts just above the screen.
+        `now` may lie in the past or future: the tile is placed where it would be
+        had it been released at exactly that time. tag is free for the caller.
+        """
+        if self.count == self.capacity:
+            self._alloc(self.capacity * 2)
+        i = self.count
+        self.note[i] = note
+        self.x[i] = x
+        self.size[i] = size
+        self.key_top[i] = key_top
+        self.speed[i] = speed
+        self.t0[i] = now
+        self.y0[i] = -size if y0 is None else y0
+        self.y[i] = self.y0[i]
+        self.state[i] = TILE_FALLING
+        self.tag[i] = tag
+        self.count += 1
+        return i
+
+    def active_count(self, note):
+        n = self.count
+        return int(np.count_nonzero((self.note[:n] == note) & (self.state[:n] != TILE_FINISHED)))
+
+    def step(self, now):
+        """
+        Advances every tile to time `now`.
+
+        Returns the indices of tiles whose bottom reached their key this
+        step (they become finished).
+        """
+        n = self.count
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        self.y[:n] = self.y0[:n] + self.speed[:n] * (now - self.t0[:n])
+        bottom = self.y[:n] + self.size[:n]
+        state = self.state[:n]
+
+        hits = np.flatnonzero((state == TILE_FALLING) & (bottom >= self.key_top[:n]))
+        state[hits] = TILE_FINISHED
+        return hits
+
+    def compact(self):
+        """
+        Drops finished tiles. Invalidates indices returned by step().
+        """
+        n = self.count
+        keep = np.flatnonzero(self.state[:n] != TILE_FINISHED)
+        if len(keep) == n:
+            return
+        m = len(keep)
+        for arr in (self.note, self.x, self.y, self.y0, self.t0, self.speed,
+                    self.size, self.key_top, self.state, self.tag):
+            arr[:m] = arr[keep]
+        self.count = m
+
+    def arrival_time(self, i):
+        """
+        Exact time tile i's bottom reaches its key line.
+        """
+        return self.t0[i] + (self.key_top[i] - self.size[i] - self.y0[i]) / self.speed[i]
+
+    def visible(self):
+        """
+        Index array of tiles still on screen (not finished).
+        """
+        return np.flatnonzero(self.state[:self.count] != TILE_FINISHED)
@@ -0,0 +1,241 @@
+import numpy as np
+
+# cv2 is imported where it is used: this module is imported at startup,
+# the first frame only reaches it on the capture/inference threads
+
+INFERENCE_MODES = ("full", "downscale", "roi")
+
+# MotionGate verdicts
+GATE_RUN = 0     # run hands.process
+GATE_REUSE = 1   # publish the previous landmarks again
+GATE_SKIP = 2    # nothing there, publish nothing
+
+
+class RoiTracker:
+    """
+    Picks the part of the camera frame that hands.process actually gets to see.
+
+    full      => the whole frame at capture resolution (old behaviour)
+    downscale => the whole frame shrunk so its long side is max_side
+    roi       => a crop around last frame's hand boxes, widened by a motion
+                 margin and shrunk to max_side; full downscaled scan when
+                 tracking is lost
+
+    Landmarks come back normalised to the crop; reproject() maps them to
+    normalised full-frame coordinates so the caller never sees the crop.
+    """
+    def __init__(self, mode="full", max_side=640, margin=0.35, min_margin_px=40,
+                 min_roi_frac=0.25, lost_after=3):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"unknown inference mode: {mode}")
+        self.mode = mode
+        self.max_side = max_side
+        self.margin = margin
+        self.min_margin_px = min_margin_px
+        self.min_roi_frac = min_roi_frac
+        self.lost_after = lost_after
+        # extra cap on the long side, set by the quality governor (any mode)
+        self.limit_side = None
+
+        self.roi = None  # (x0, y0, x1, y1) in frame pixels, None => full scan
+        self._buffers = {}
+        self.missed = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def prepare(self, frame):
+        """
+        Returns (rgb image for hands.process, (x0, y0, crop_w, crop_h, frame_w, frame_h)).
+        """
+        import cv2
+
+        fh, fw = frame.shape[:2]
+        if self.mode == "roi" and self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            self.roi_scans += 1
+        else:
+            x0, y0, x1, y1 = 0, 0, fw, fh
+            self.full_scans += 1
+        crop = frame[y0:y1, x0:x1]
+        cw, ch = x1 - x0, y1 - y0
+
+        side = self.max_side if self.mode != "full" else None
+        if self.limit_side is not None:
+            side = self.limit_side if side is None else min(side, self.limit_side)
+        if side is not None:
+            scale = side / float(max(cw, ch))
+            if scale < 1.0:
+                size = (max(1, int(round(cw * scale))), max(1, int(round(ch * scale))))
+                small = self._buffer("small", (size[1], size[0], 3))
+                crop = cv2.resize(crop, size, dst=small, interpolation=cv2.INTER_AREA)
+
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB, dst=self._buffer("rgb", crop.shape))
+        return rgb, (x0, y0, cw, ch, fw, fh)
+
+    def _buffer(self, name, shape):
+        # reused while the size holds still, which it does outside roi mode
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    @staticmethod
+    def reproject(landmarks, transform):
+        """
+        Crop-normalised landmarks => frame-normalised landmarks (in place).
+
+        Scaling the crop does not matter because MediaPipe normalises by the
+        image it was given, so only the crop offset and size take part.
+        """
+        x0, y0, cw, ch, fw, fh = transform
+        if len(landmarks) == 0 or (cw, ch) == (fw, fh):
+            return landmarks
+        landmarks[..., 0] = (x0 + landmarks[..., 0] * cw) / fw
+        landmarks[..., 1] = (y0 + landmarks[..., 1] * ch) / fh
+        # z uses the same scale as x
+        landmarks[..., 2] *= cw / float(fw)
+        return landmarks
+
+    def update(self, landmarks, frame_w, frame_h):
+        """
+        Feeds back frame-normalised landmarks to place the next crop.
+        """
+        if self.mode != "roi":
+            return
+        if len(landmarks) == 0:
+            self.missed += 1
+            if self.missed >= self.lost_after:
+                self.roi = None
+            else:
+                self.roi = self._grow(self.roi, frame_w, frame_h)
+            return
+        self.missed = 0
+
+        xs = landmarks[..., 0] * frame_w
+        ys = landmarks[..., 1] * frame_h
+        bx0, bx1 = float(xs.min()), float(xs.max())
+        by0, by1 = float(ys.min()), float(ys.max())
+
+        # motion margin scales with hand size so fast moves stay inside
+        bw, bh = bx1 - bx0, by1 - by0
+        mx = max(self.min_margin_px, bw * self.margin)
+        my = max(self.min_margin_px, bh * self.margin)
+        bx0, bx1 = bx0 - mx, bx1 + mx
+        by0, by1 = by0 - my, by1 + my
+
+        # never crop tighter than min_roi_frac of the frame
+        min_w, min_h = frame_w * self.min_roi_frac, frame_h * self.min_roi_frac
+        if bx1 - bx0 < min_w:
+            cx = (bx0 + bx1) / 2
+            bx0, bx1 = cx - min_w / 2, cx + min_w / 2
+        if by1 - by0 < min_h:
+            cy = (by0 + by1) / 2
+            by0, by1 = cy - min_h / 2, cy + min_h / 2
+
+        self.roi = self._clip((bx0, by0, bx1, by1), frame_w, frame_h)
+
+    def _grow(self, roi, frame_w, frame_h):
+        # hand vanished for a frame or two => look a bit wider before giving up
+        if roi is None:
+            return None
+        x0, y0, x1, y1 = roi
+        gx, gy = (x1 - x0) * 0.25, (y1 - y0) * 0.25
+        return self._clip((x0 - gx, y0 - gy, x1 + gx, y1 + gy), frame_w, frame_h)
+
+    @staticmethod
+    def _clip(box, frame_w, frame_h):
+        x0, y0, x1, y1 = box
+        x0 = int(max(0, np.floor(x0)))
+        y0 = int(max(0, np.floor(y0)))
+        x1 = int(min(frame_w, np.ceil(x1)))
+        y1 = int(min(frame_h, np.ceil(y1)))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        return (x0, y0, x1, y1)
+
+    def stats(self):
+        return {"mode": self.mode, "roi": self.roi, "full_scans": self.full_scans,
+                "roi_scans": self.roi_scans}
+
+
+class MotionGate:
+    """
+    Decides whether a frame is worth a hands.process call.
+
+    The region (normalised x0, y0, x1, y1: the keyboard plus the space
+    hands come in from) is shrunk to `size` pixels wide, turned grey and
+    diffed against the previous frame's copy. No motion and no tracked
+    hands => skip; no motion but hands still tracked => reuse the last
+    landmarks for up to max_reuse frames. Every `refresh` frames inference
+    runs regardless, so a hand that slid in very slowly is still found.
+    All buffers are reused; the check costs well under a millisecond.
+    """
+    def __init__(self, region=(0.0, 0.0, 1.0, 1.0), size=80, pixel_threshold=12,
+                 motion_fraction=0.004, max_reuse=3, refresh=30):
+        self.region = region
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.motion_fraction = motion_fraction
+        self.max_reuse = max_reuse
+        self.refresh = refresh
+
+        self._prev = None
+        self._small = None
+        self._gray = None
+        self._diff = None
+        self.since_run = 0
+        self.reused_in_row = 0
+        self.ran = 0
+        self.reused = 0
+        self.skipped = 0
+
+    def _motion(self, frame):
+        import cv2
+
+        fh, fw = frame.shape[:2]
+        x0, y0, x1, y1 = self.region
+        crop = frame[int(y0 * fh):max(int(y0 * fh) + 1, int(y1 * fh)),
+                     int(x0 * fw):max(int(x0 * fw) + 1, int(x1 * fw))]
+        # every n-th pixel, then an area average over what is left: enough to
+        # drown out sensor noise at a fraction of a full INTER_AREA pass
+        step = max(1, crop.shape[1] // (self.size * 4))
+        crop = crop[::step, ::step]
+        ch, cw = crop.shape[:2]
+        size = (self.size, max(1, int(round(self.size * ch / float(cw)))))
+        if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._diff = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._prev = None
+        cv2.resize(crop, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        if self._prev is None:
+            self._prev = self._gray.copy()
+            return True
+        cv2.absdiff(self._gray, self._prev, dst=self._diff)
+        self._prev, self._gray = self._gray, self._prev
+        moving = np.count_nonzero(self._diff > self.pixel_threshold)
+        return moving > self.motion_fraction * self._diff.size
+
+    def check(self, frame, hands_tracked):
+        """
+        Returns GATE_RUN, GATE_REUSE or GATE_SKIP for this frame.
+        """
+        motion = self._motion(frame)
+        self.since_run += 1
+        if motion or self.since_run >= self.refresh or \
+                (hands_tracked and self.reused_in_row >= self.max_reuse):
+            self.since_run = 0
+            self.reused_in_row = 0
+            self.ran += 1
+            return GATE_RUN
+        if hands_tracked:
+            self.reused_in_row += 1
+            self.reused += 1
+            return GATE_REUSE
+        self.skipped += 1
+        return GATE_SKIP
+
+    def stats(self):
+        return {"ran": self.ran, "reused": self.reused, "skipped": self.skipped}